@@ -1,51 +1,84 @@
-from flask import Flask, request, jsonify
-import yfinance as yf
+import time
+_import_start = time.perf_counter()
+from flask import Flask, request, jsonify, Response, stream_with_context
 import datetime
-import pandas as pd
-from utilities import analyze_stock_reversals, find_stocks_with_volume_trend
+import json
+# Only light modules load here. pandas, yfinance and the analysis modules are
+# imported by the routes that need them, so a cold start doesn't pay for them up front.
+from instrumentation import init_app, inc, stage, render_prometheus, lazy_import, record_startup_step, startup_step, startup_report
+from response_cache import cached_route, market_today
+from serialization import number_formatter, symbol_response
+record_startup_step('import flask and app modules', time.perf_counter() - _import_start)
 
 
 
-app = Flask(__name__)
+with startup_step('create app'):
+    app = Flask(__name__)
+    init_app(app)
 
 @app.route('/')
 def hello_world():
     return 'Hello, world!'
 
 @app.route('/get-reversal-data',  methods=['POST'])
+@cached_route(historical=lambda body: (body or {}).get('interval', '1d') == '1d')
 def get_reversal_points():
+    utilities = lazy_import('utilities')
+    analyze_reversal_request = utilities.analyze_reversal_request
+    analyze_intraday_request = lazy_import('intraday').analyze_intraday_request
+    materialize = lazy_import('materialize')
     data = request.get_json()
     
     if 'ticker' not in data:
             return jsonify({'error': 'Missing key "symbols" in JSON data'}), 400
 
     ticker = data['ticker']
-    start_date = data.get('start_date', "2024-01-01")
-    volume_start_date = data.get('volume_start_date', "2023-01-01")
-    tolerance_percentage = float(data.get('tolerance_percentage', 3.0))
+    start_date = data.get('start_date', utilities.REVERSAL_START_DATE)
+    volume_start_date = data.get('volume_start_date', utilities.VOLUME_START_DATE)
+    tolerance_percentage = float(data.get('tolerance_percentage', utilities.TOLERANCE_PERCENTAGE))
     num_reversals = int(data.get('num_reversals', 3))
-    today_date = datetime.date.today()
+    interval = data.get('interval', '1d')
+    # The session date is India's, not the server's
+    today_date = market_today()
     current_date = today_date.strftime('%Y-%m-%d')
-    volume_analysis = find_stocks_with_volume_trend(ticker, volume_start_date, today_date)
 
     try:
-        reversal_points, sma_values = analyze_stock_reversals(ticker, start_date, current_date, tolerance_percentage, num_reversals)
-        response = {
-            'ticker': ticker,
-            'reversal_points': [[round(point[0], 2), point[1]] for point in reversal_points],
-            '20SMA': "{:.2f}".format(sma_values['20SMA']),
-            '50SMA': "{:.2f}".format(sma_values['50SMA']),
-            '200SMA': "{:.2f}".format(sma_values['200SMA']),
-            'avg_volume_uptrend': "{:.2f}".format(volume_analysis['avg_volume_uptrend']),
-            'avg_volume_downtrend': "{:.2f}".format(volume_analysis['avg_volume_downtrend']),
-            'higher_volume_uptrend': bool(volume_analysis['higher_volume_uptrend']),
-            'percentage_higher': "{:.2f}".format(volume_analysis['percentage_higher'])
-        }
-        return jsonify(response)
+        if interval == '1d':
+            # The nightly table answers requests with the default settings without any fetching
+            materialized = materialize.lookup(ticker, start_date, volume_start_date, current_date, tolerance_percentage, num_reversals)
+            if materialize.TABLE_PATH is None:
+                inc('materialized_lookups_total', result='unconfigured')
+            else:
+                inc('materialized_lookups_total', result='hit' if materialized is not None else 'miss')
+            reversal_points, sma_values, volume_analysis = materialized or analyze_reversal_request(
+                ticker, start_date, volume_start_date, current_date, tolerance_percentage, num_reversals
+            )
+        else:
+            # Intraday bars include today's session
+            reversal_points, sma_values, volume_analysis = analyze_intraday_request(
+                ticker, start_date, volume_start_date, today_date + datetime.timedelta(days=1),
+                tolerance_percentage, num_reversals, interval
+            )
+        with stage('serialize'):
+            response = {
+                'ticker': ticker,
+                'interval': interval,
+                'reversal_points': [[round(point[0], 2), point[1]] for point in reversal_points],
+                '20SMA': "{:.2f}".format(sma_values['20SMA']),
+                '50SMA': "{:.2f}".format(sma_values['50SMA']),
+                '200SMA': "{:.2f}".format(sma_values['200SMA']),
+                'avg_volume_uptrend': "{:.2f}".format(volume_analysis['avg_volume_uptrend']),
+                'avg_volume_downtrend': "{:.2f}".format(volume_analysis['avg_volume_downtrend']),
+                'higher_volume_uptrend': bool(volume_analysis['higher_volume_uptrend']),
+                'percentage_higher': "{:.2f}".format(volume_analysis['percentage_higher'])
+            }
+            body = jsonify(response)
+        return body
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 @app.route('/get_stock_data', methods=['POST'])
+@cached_route()
 def get_stock_data():
     try:
         # Get the JSON data from the request
@@ -58,95 +91,136 @@ def get_stock_data():
         # Retrieve the array of stock symbols from the JSON data
         symbols = data['symbols']
         date = data.get('date', None)
+        dates = data.get('dates', None)
+        horizons = data.get('horizons', None)
+        fmt = number_formatter(bool(data.get('numeric', False)))
+        if dates or horizons:
+            if not (dates or date):
+                return jsonify({'error': 'Missing key "dates" in JSON data'}), 400
+            horizons = [int(horizon) for horizon in horizons or LEGACY_HORIZONS]
+            rows = session_offset_rows(symbols, dates or [date], horizons, fmt)
+        else:
+            rows = stock_data_rows(symbols, date, fmt)
+        return symbol_response(rows, stream=bool(data.get('stream', False)))
 
-        # Fetch data from Yahoo Finance for each symbol
-        stock_data = {}
-        for symbol in symbols:
-            try:
-                stock = yf.Ticker(symbol)
-                third_trading_day = None
-                sixth_trading_day = None
-                month_trading_session = None
-                next_day = None
-
-                if date:
-                    start_date = datetime.datetime.strptime(date, "%Y-%m-%d")
-                    end_date = start_date + datetime.timedelta(days=35)
-                    data = stock.history(start=date, end=end_date)
-                    lastest_data = stock.history(period="1d")
-                    
-                    if len(data) >= 2:
-                        next_day = data.iloc[1]
-
-                    if len(data) >= 3:
-                        third_trading_day = data.iloc[2]  # 0-based indexing, so 2 means the 3rd trading day
-
-                    if len(data) >= 6:
-                        sixth_trading_day = data.iloc[5]
-                    
-                    if len(data) >= 23:
-                        month_trading_session = data.iloc[22]
-
-                else:
-                    data = stock.history(period="1d")
-                close_price = data['Close'].values[0] if not data.empty else None
-                open_price = data['Open'].values[0] if not data.empty else None
-                day_change = data['Close'].values[0] - data['Open'].values[0] if not data.empty else None
-                day_change_percentage = (day_change / data['Open'].values[0]) * 100 if not data.empty else None
-                modified_string  = symbol.replace(".NS", "")
-                if date:
-                    latest_price = lastest_data['Close'].values[0] if not data.empty else None
-                    third_day_close = third_trading_day['Close'] if third_trading_day is not None else None
-                    sixth_trading_day = sixth_trading_day['Close'] if sixth_trading_day is not None else None
-                    month_trading_session = month_trading_session['Close'] if month_trading_session is not None else None
-                    next_day = next_day['Close'] if next_day is not None else None
-                    stock_data[modified_string] = {
-                        'date_price': "{:.2f}".format(close_price),
-                        'latest_price': "{:.2f}".format(latest_price),
-                        'change_percentage': "{:.2f}".format(((latest_price - close_price)/close_price) * 100),
-                        'next_day': "{:.2f}".format(next_day) if next_day is not None else None,
-                        'third_trading_day': "{:.2f}".format(third_day_close) if third_day_close is not None else None,
-                        'sixth_trading_day': "{:.2f}".format(sixth_trading_day) if sixth_trading_day is not None else None,
-                        'month_trading_session': "{:.2f}".format(month_trading_session) if month_trading_session is not None else None
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Sessions after the date reported by the single-date form of /get_stock_data
+LEGACY_HORIZONS = [1, 2, 5, 22]
+
+def stock_data_rows(symbols, date, fmt):
+    iter_stock_chunks = lazy_import('utilities').iter_stock_chunks
+    iter_stock_frames = lazy_import('utilities').iter_stock_frames
+    iter_session_closes = lazy_import('utilities').iter_session_closes
+    np = lazy_import('numpy')
+
+    if not date:
+        # Fetch the symbols in grouped requests, one chunk at a time
+        for chunk, frames in iter_stock_chunks(symbols, period="1d"):
+            for symbol in chunk:
+                try:
+                    data = frames[symbol]
+                    if data.empty:
+                        raise ValueError(f"No data found for {symbol}")
+                    close_price = data['Close'].values[0]
+                    open_price = data['Open'].values[0]
+                    day_change_percentage = ((close_price - open_price) / open_price) * 100
+                    yield symbol.replace(".NS", ""), {
+                    'open': fmt(open_price),
+                    'close': fmt(close_price),
+                    'day_change_percentage': fmt(day_change_percentage)
                     }
-                    # Calculate percentage change for 'third_trading_day' if it's not None
-                    if stock_data[modified_string]['third_trading_day'] is not None:
-                        stock_data[modified_string]['third_day_change_percentage'] = "{:.2f}".format(
-                            ((third_day_close - close_price) / close_price) * 100
-                        )
-                    
-                    if stock_data[modified_string]['next_day'] is not None:
-                        stock_data[modified_string]['next_day_percentage_change'] = "{:.2f}".format(
-                            ((next_day - close_price) / close_price) * 100
-                        )
-
-                    # Calculate percentage change for 'sixth_trading_day' if it's not None
-                    if stock_data[modified_string]['sixth_trading_day'] is not None:
-                        stock_data[modified_string]['sixth_day_change_percentage'] = "{:.2f}".format(
-                            ((sixth_trading_day - close_price) / close_price) * 100
-                        )
-                    
-                    if stock_data[modified_string]['month_trading_session'] is not None:
-                        stock_data[modified_string]['month_trading_change_percentage'] = "{:.2f}".format(
-                            ((month_trading_session - close_price) / close_price) * 100
-                        )
-
-                else:
-                    stock_data[modified_string] = {
-                    'open': "{:.2f}".format(open_price),
-                    'close': "{:.2f}".format(close_price),
-                    'day_change_percentage': "{:.2f}".format(day_change_percentage)
+                except Exception as e:
+                    yield symbol, {'error': str(e)}
+        return
+
+    # Only the date's session and the sessions 1, 2, 5 and 22 after it are downloaded
+    for chunk, sessions, closes in iter_session_closes(symbols, [date], [0] + LEGACY_HORIZONS):
+        latest_frames = dict(iter_stock_frames(chunk, len(chunk), len(chunk), period="1d"))
+        for symbol in chunk:
+            try:
+                close_price, next_day, third_day_close, sixth_trading_day, month_trading_session = [
+                    None if np.isnan(close) else close for close in closes[symbol][0]
+                ]
+                if close_price is None:
+                    raise ValueError(f"No data found for {symbol}")
+                lastest_data = latest_frames[symbol]
+                latest_price = lastest_data['Close'].values[-1]
+                stock_data = {
+                    'date_price': fmt(close_price),
+                    'latest_price': fmt(latest_price),
+                    'change_percentage': fmt(((latest_price - close_price)/close_price) * 100),
+                    'next_day': fmt(next_day),
+                    'third_trading_day': fmt(third_day_close),
+                    'sixth_trading_day': fmt(sixth_trading_day),
+                    'month_trading_session': fmt(month_trading_session)
+                }
+                # Calculate percentage change for 'third_trading_day' if it's not None
+                if stock_data['third_trading_day'] is not None:
+                    stock_data['third_day_change_percentage'] = fmt(
+                        ((third_day_close - close_price) / close_price) * 100
+                    )
+                
+                if stock_data['next_day'] is not None:
+                    stock_data['next_day_percentage_change'] = fmt(
+                        ((next_day - close_price) / close_price) * 100
+                    )
+
+                # Calculate percentage change for 'sixth_trading_day' if it's not None
+                if stock_data['sixth_trading_day'] is not None:
+                    stock_data['sixth_day_change_percentage'] = fmt(
+                        ((sixth_trading_day - close_price) / close_price) * 100
+                    )
+                
+                if stock_data['month_trading_session'] is not None:
+                    stock_data['month_trading_change_percentage'] = fmt(
+                        ((month_trading_session - close_price) / close_price) * 100
+                    )
+                yield symbol.replace(".NS", ""), stock_data
+            except Exception as e:
+                yield symbol, {'error': str(e)}
+
+def session_offset_rows(symbols, dates, horizons, fmt):
+    """Closes and changes for every (date, horizon) pair of each symbol, keyed by the requested date."""
+    iter_stock_frames = lazy_import('utilities').iter_stock_frames
+    iter_session_closes = lazy_import('utilities').iter_session_closes
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+    for chunk, sessions, closes in iter_session_closes(symbols, dates, [0] + horizons):
+        latest_frames = dict(iter_stock_frames(chunk, len(chunk), len(chunk), period="1d"))
+        for symbol in chunk:
+            try:
+                latest = latest_frames[symbol]
+                latest_price = latest['Close'].values[-1] if not latest.empty else None
+                by_date = {}
+                for i, date in enumerate(dates):
+                    close_price = closes[symbol][i, 0]
+                    if np.isnan(close_price):
+                        by_date[date] = {'error': f"No data found for {symbol} on {date}"}
+                        continue
+                    by_date[date] = {
+                        'session': pd.Timestamp(sessions[i, 0]).strftime('%Y-%m-%d'),
+                        'date_price': fmt(close_price),
+                        'latest_price': fmt(latest_price),
+                        'change_percentage': fmt(((latest_price - close_price) / close_price) * 100) if latest_price is not None else None,
+                        'horizons': {
+                            str(horizon): {
+                                'session': pd.Timestamp(sessions[i, j + 1]).strftime('%Y-%m-%d') if not pd.isna(sessions[i, j + 1]) else None,
+                                'close': fmt(closes[symbol][i, j + 1]) if not np.isnan(closes[symbol][i, j + 1]) else None,
+                                'change_percentage': fmt(((closes[symbol][i, j + 1] - close_price) / close_price) * 100) if not np.isnan(closes[symbol][i, j + 1]) else None
+                            }
+                            for j, horizon in enumerate(horizons)
+                        }
                     }
+                yield symbol.replace(".NS", ""), by_date
             except Exception as e:
-                stock_data[symbol] = {'error': str(e)}
-
-        return jsonify(stock_data)
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+                yield symbol, {'error': str(e)}
     
 
 @app.route('/backtest', methods=['POST'])
+@cached_route()
 def backtest_data():
     try:
         # Get the JSON data from the request
@@ -167,46 +241,57 @@ def backtest_data():
         date = data.get('date', None)
         fixed_investment = data['fixed_investment']
         target_percentage = data.get('target_percentage', None)
-
-        # Fetch data from Yahoo Finance for each symbol
-        stock_data = {}
-        for symbol in symbols:
-            try:
-                stock = yf.Ticker(symbol)
-                start_date = datetime.datetime.strptime(date, "%Y-%m-%d")
-                end_date = start_date + datetime.timedelta(days=5)
-                data = stock.history(start=date, end=end_date)
-                latest_data = stock.history(period="1d")
-                lowest_price = stock.history(start=date, interval="1d")
-                high_price = lowest_price['High'].max()
-                date_of_high = lowest_price[lowest_price['High'] == high_price].index[0]
-                lowest_price = lowest_price['Low'].min()
-
-                close_price = data['Close'].values[0] if not data.empty else None
-                target_price = close_price * (1 + target_percentage / 100) if target_percentage else None
-                target_hit = high_price > target_price if target_price is not None else False
-                number_of_stocks = create_fixed_investment_portfolio({symbol: close_price}, fixed_investment)
-                modified_string  = symbol.replace(".NS", "")
-                latest_price = latest_data['Close'].values[0] if not data.empty else None
-                stock_data[modified_string] = {
-                    'date_price': "{:.2f}".format(close_price),
-                    'latest_price': "{:.2f}".format(latest_price),
-                    'change_percentage': "{:.2f}".format(((latest_price - close_price)/close_price) * 100),
-                    'number_of_stocks': number_of_stocks[modified_string] or 1,
-                    'total_stock_value': "{:.2f}".format(number_of_stocks[modified_string] * close_price) if number_of_stocks[modified_string] is not None else None,
-                    'lowest_price':  "{:.2f}".format(lowest_price) if lowest_price is not None else None,
-                    'lowest_percentage': "{:.2f}".format(((lowest_price - close_price)/close_price) * 100),
-                    'high_price': "{:.2f}".format(high_price) if high_price is not None else None,
-                    'date_of_high': date_of_high.date() if date_of_high is not None else None,
-                    'target_hit': bool(target_hit)
-                }
-            except Exception as e:
-                stock_data[symbol] = {'error': str(e)}
-
-        return jsonify(stock_data)
+        # The entry is the first session on or after the date; nothing to fetch if that hasn't traded yet
+        session = lazy_import('trading_calendar').get_calendar().sessions_after([date], [0])[0, 0]
+        if not session < lazy_import('numpy').datetime64(market_today() + datetime.timedelta(days=1)):
+            return jsonify({'error': f'No trading session on or after {date} yet'}), 400
+        fmt = number_formatter(bool(data.get('numeric', False)))
+        rows = backtest_rows(symbols, date, fixed_investment, target_percentage, fmt)
+        return symbol_response(rows, stream=bool(data.get('stream', False)))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def backtest_rows(symbols, date, fixed_investment, target_percentage, fmt):
+    iter_stock_frames = lazy_import('utilities').iter_stock_frames
+    hold_summary = lazy_import('backtest').hold_summary
+    # One series per symbol from the entry date to today, fetched in grouped requests
+    for symbol, data in iter_stock_frames(symbols, start=date):
+        try:
+            if data.empty:
+                raise ValueError(f"No data found for {symbol} since {date}")
+            with stage('indicators', symbol):
+                summary = hold_summary(data, target_percentage)
+            close_price = summary['entry_price']
+            latest_price = summary['latest_price']
+            high_price = summary['high_price']
+            lowest_price = summary['low_price']
+            date_of_high = data.index[summary['high_index']]
+            date_of_low = data.index[summary['low_index']]
+            target_index = summary['target_index']
+            target_hit = target_index is not None
+            target_hit_date = data.index[target_index] if target_hit else None
+
+            number_of_stocks = create_fixed_investment_portfolio({symbol: close_price}, fixed_investment)
+            modified_string  = symbol.replace(".NS", "")
+            yield modified_string, {
+                'date_price': fmt(close_price),
+                'latest_price': fmt(latest_price),
+                'change_percentage': fmt(((latest_price - close_price)/close_price) * 100),
+                'number_of_stocks': number_of_stocks[modified_string] or 1,
+                'total_stock_value': fmt(number_of_stocks[modified_string] * close_price) if number_of_stocks[modified_string] is not None else None,
+                'lowest_price':  fmt(lowest_price),
+                'lowest_percentage': fmt(((lowest_price - close_price)/close_price) * 100),
+                'high_price': fmt(high_price),
+                'date_of_high': date_of_high.date() if date_of_high is not None else None,
+                'date_of_low': date_of_low.date() if date_of_low is not None else None,
+                'target_hit': bool(target_hit),
+                'target_hit_date': target_hit_date.date() if target_hit_date is not None else None,
+                'sessions_to_target': target_index,
+                'days_to_target': (target_hit_date - data.index[0]).days if target_hit_date is not None else None
+            }
+        except Exception as e:
+            yield symbol, {'error': str(e)}
     
 def create_fixed_investment_portfolio(stock_prices, fixed_investment):
     num_stocks = len(stock_prices)
@@ -238,79 +323,338 @@ def swing_backtest_data():
         # Retrieve the array of stock symbols from the JSON data
         symbols = inputData['symbols']
         date = inputData.get('start_date', None)
+        stop_loss_percent = inputData['stop_loss_percent']
+        target_percent = inputData['target_percent']
+        fmt = number_formatter(bool(inputData.get('numeric', False)))
+        rows = swing_backtest_rows(symbols, date, stop_loss_percent, target_percent, fmt)
+        return symbol_response(rows, stream=bool(inputData.get('stream', False)))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def swing_backtest_rows(symbols, date, stop_loss_percent, target_percent, fmt):
+    iter_stock_chunks = lazy_import('utilities').iter_stock_chunks
+    swing_backtest = lazy_import('swing_backtest').swing_backtest
+    pd = lazy_import('pandas')
+    end_date = datetime.datetime.now().date()
+    # Fetch the symbols in grouped requests and run the backtest kernel over each chunk
+    for chunk, frames in iter_stock_chunks(symbols, start=date, end=end_date, auto_adjust=False):
+        with stage('backtest'):
+            trades = swing_backtest(frames.items(), stop_loss_percent, target_percent)
+
+        for symbol in chunk:
+            try:
+                data = frames[symbol]
+                trade = trades[symbol]
+                if data.empty:
+                    raise ValueError(f"No data found for {symbol}")
+                if trade is None:
+                    yield symbol.replace(".NS", ""), {}
+                    continue
+                exit_index = trade['exit_index']
+                yield symbol.replace(".NS", ""), {
+                    'entry_date': pd.Timestamp(data.index[trade['entry_index']]).strftime('%Y-%m-%d'),
+                    'entry_price': fmt(trade['entry_price']),
+                    'exit_date': pd.Timestamp(data.index[exit_index]).strftime('%Y-%m-%d') if exit_index is not None else None,
+                    'exit_price': fmt(trade['exit_price']),
+                    'result': trade['result'],
+                    'profit': fmt(trade['profit']),
+                    'stop_loss': fmt(trade['stop_loss']),
+                    'target': fmt(trade['target']),
+                    'latest_price': fmt(trade['latest_price'])
+                }
+            except Exception as e:
+                yield symbol.replace(".NS", ""), {'error': str(e)}
+
+@app.route('/portfolio-backtest', methods=['POST'])
+@cached_route()
+def portfolio_backtest():
+    iter_stock_frames = lazy_import('utilities').iter_stock_frames
+    run_portfolio = lazy_import('portfolio').run_portfolio
+    try:
+        inputData = request.get_json()
+        for key in ('symbols', 'start_date', 'fixed_investment', 'stop_loss_percent', 'target_percent'):
+            if key not in inputData:
+                return jsonify({'error': f'Missing key "{key}" in JSON data'}), 400
+
+        symbols = inputData['symbols']
+        date = inputData['start_date']
         end_date = datetime.datetime.now().date()
-        # Fetch data from Yahoo Finance for each symbol
-        stock_data = {}
-        result = {}
-        for symbol in symbols:
+        fmt = number_formatter(bool(inputData.get('numeric', False)))
+        max_positions = inputData.get('max_positions')
+        if max_positions is not None:
             try:
-                data = yf.download(symbol, start=date, end=end_date)
-                first_date = pd.Timestamp(data.index[0])
-                latest_data = data.iloc[-1]
-                # Initialize variables for tracking positions
-                position_opened = False
-                entry_price = 0
-                stop_loss_percent = inputData['stop_loss_percent']
-                target_percent = inputData['target_percent']
-                stop_loss_price = 0
-                target_price = 0
-                trailing_tracker = 0
-
-                for i in range(1, len(data)):
-                    current_low = data['Low'][i]
-                    current_high = data['High'][i]
-                    print("stp", stop_loss_price)
-                    print(target_price)
-                    if not position_opened:
-                        # Check if the current day meets the entry conditions
-                        # For example, entering if the close price increases by a certain percentage
-                        entry_price = data['Close'][0]
-                        stop_loss_price = entry_price * (1 - stop_loss_percent / 100)
-                        target_price = entry_price * (1 + target_percent / 100)
-                        position_opened = True
-                    else:
-                        # Check if the stop loss or target is hit
-                        if current_low <= stop_loss_price:
-                            position_opened = False
-                            result = {
-                                'entry_date': first_date.strftime('%Y-%m-%d'),
-                                'entry_price': "{:.2f}".format(entry_price),
-                                'exit_date': pd.Timestamp(data.index[i]).strftime('%Y-%m-%d'),
-                                'exit_price': "{:.2f}".format(stop_loss_price),
-                                'result': 'Hit',
-                                'profit': "{:.2f}".format(stop_loss_price - entry_price),
-                                'stop_loss': "{:.2f}".format(stop_loss_price),
-                                'target': "{:.2f}".format(target_price),
-                                'latest_price': "{:.2f}".format(latest_data['Close'])
-                            }
-                            break
-
-                        elif current_high >= target_price:
-                            stop_loss_price = entry_price if trailing_tracker == 0 else target_price
-                            trailing_tracker = 1
-                            target_price = target_price * (1 + target_percent / 100) 
-                            
-                        else:
-                            result = {
-                                'entry_date': first_date.strftime('%Y-%m-%d'),
-                                'entry_price': "{:.2f}".format(entry_price),
-                                'exit_date': None,
-                                'exit_price': None,
-                                'result': 'Open',
-                                'profit': "{:.2f}".format(latest_data['Close'] - entry_price),
-                                'stop_loss': "{:.2f}".format(stop_loss_price),
-                                'target': "{:.2f}".format(target_price),
-                                'latest_price': "{:.2f}".format(latest_data['Close'])
-                            }
+                max_positions = int(max_positions)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'max_positions must be a whole number'}), 400
+            if max_positions < 1:
+                return jsonify({'error': 'max_positions must be at least 1'}), 400
+
+        # Same unadjusted prices as /swing-backtest, on one date index shared by every symbol
+        frames = list(iter_stock_frames(symbols, start=date, end=end_date, auto_adjust=False))
+        with stage('backtest'):
+            curve, trades = run_portfolio(
+                frames,
+                float(inputData['fixed_investment']),
+                float(inputData['stop_loss_percent']),
+                float(inputData['target_percent']),
+                max_positions=max_positions
+            )
+        if curve.empty:
+            return jsonify({'error': f'No data found for {symbols} since {date}'}), 400
+
+        with stage('serialize'):
+            equity = curve['equity']
+            body = jsonify({
+                'final_equity': fmt(equity.iloc[-1]),
+                'return_percentage': fmt((equity.iloc[-1] / float(inputData['fixed_investment']) - 1) * 100),
+                'max_drawdown_percentage': fmt(curve['drawdown'].min() * 100),
+                'trades': [{
+                    'symbol': trade['symbol'].replace(".NS", ""),
+                    'entry_date': trade['entry_date'].strftime('%Y-%m-%d'),
+                    'entry_price': fmt(trade['entry_price']),
+                    'shares': trade['shares'],
+                    'exit_date': trade['exit_date'].strftime('%Y-%m-%d') if trade['exit_date'] is not None else None,
+                    'exit_price': fmt(trade['exit_price']),
+                    'result': trade['result'],
+                    'profit': fmt(trade['profit']),
+                    'stop_loss': fmt(trade['stop_loss']),
+                    'target': fmt(trade['target'])
+                } for trade in trades],
+                # Daily curve as parallel arrays
+                'dates': curve.index.strftime('%Y-%m-%d').tolist(),
+                'equity': equity.round(2).tolist(),
+                'cash': curve['cash'].round(2).tolist(),
+                'drawdown_percentage': (curve['drawdown'] * 100).round(2).tolist(),
+                'open_positions': curve['open_positions'].tolist()
+            })
+        return body
 
-                stock_data[symbol.replace(".NS", "")] = result
-            except Exception as e:
-                stock_data[symbol.replace(".NS", "")] = {'error': str(e)}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify(stock_data)
+@app.route('/screener', methods=['POST'])
+def screener():
+    screen = lazy_import('screener').screen
+    load_universe = lazy_import('screener').load_universe
+    CHECKS = lazy_import('screener').CHECKS
+    inputData = request.get_json(silent=True) or {}
+
+    # Default to the whole universe in stocksList.txt
+    symbols = inputData.get('symbols') or load_universe()
+    checks = inputData.get('checks', list(CHECKS))
+    unknown_checks = [check for check in checks if check not in CHECKS]
+    if unknown_checks:
+        return jsonify({'error': f'Unknown checks {unknown_checks}, expected any of {list(CHECKS)}'}), 400
+
+    include_all = bool(inputData.get('include_all', False))
+    # Checked here: inside the stream an error would cut the response short
+    try:
+        max_workers = int(inputData.get('max_workers', 8))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_workers must be a whole number'}), 400
+    if max_workers < 1:
+        return jsonify({'error': 'max_workers must be at least 1'}), 400
+    max_workers = min(max_workers, 16)
+    results = screen(
+        symbols,
+        start_date=inputData.get('start_date'),
+        max_workers=max_workers,
+        checks=checks,
+        tolerance_percentage=float(inputData.get('tolerance_percentage', 3.0)),
+        num_reversals=int(inputData.get('num_reversals', 3)),
+        proximity_percentage=float(inputData.get('proximity_percentage', 2.0))
+    )
+
+    def generate():
+        for result in results:
+            if include_all or result.get('match'):
+                yield json.dumps(result) + '\n'
+
+    # One JSON object per line, sent as soon as each symbol is screened
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/trend-lines', methods=['POST'])
+@cached_route()
+def trend_lines():
+    load_universe = lazy_import('screener').load_universe
+    inputData = request.get_json(silent=True) or {}
+
+    # Default to the whole universe in stocksList.txt
+    symbols = inputData.get('symbols') or load_universe()
+    lookbacks = [int(lookback) for lookback in inputData.get('lookbacks', [25])]
+    if any(lookback < 2 for lookback in lookbacks):
+        return jsonify({'error': 'Every lookback must be at least 2 bars'}), 400
+    start_date = inputData.get('start_date') or (datetime.date.today() - datetime.timedelta(days=365)).strftime('%Y-%m-%d')
+
+    try:
+        fmt = number_formatter(bool(inputData.get('numeric', False)))
+        rows = trend_line_rows(symbols, start_date, lookbacks, fmt)
+        return symbol_response(rows, stream=bool(inputData.get('stream', False)))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def trend_line_rows(symbols, start_date, lookbacks, fmt):
+    iter_stock_chunks = lazy_import('utilities').iter_stock_chunks
+    latest_trend_lines = lazy_import('trend').latest_trend_lines
+    pd = lazy_import('pandas')
+
+    def describe(m, c, r2, lookback):
+        if pd.isna(m):
+            return None
+        return {
+            'slope': fmt(m, 4),
+            'intercept': fmt(c),
+            'r_squared': fmt(r2, 3) if not pd.isna(r2) else None,
+            # Where the line sits on the latest bar
+            'latest_value': fmt(c + m * (lookback - 1))
+        }
+
+    for chunk, frames in iter_stock_chunks(symbols, start=start_date):
+        frames = {symbol: data for symbol, data in frames.items() if not data.empty}
+        with stage('indicators'):
+            lines = latest_trend_lines(frames, lookbacks)
+
+        for symbol in chunk:
+            if symbol not in frames:
+                yield symbol.replace(".NS", ""), {'error': f"No data found for {symbol}"}
+                continue
+            yield symbol.replace(".NS", ""), {
+                'date': pd.Timestamp(frames[symbol].index[-1]).strftime('%Y-%m-%d'),
+                'lines': {
+                    str(lookback): {name: describe(*line, lookback) for name, line in by_name.items()}
+                    for lookback, by_name in lines[symbol].items()
+                }
+            }
+
+@app.route('/reversal-ranges', methods=['POST'])
+@cached_route()
+def reversal_ranges():
+    iter_stock_frames = lazy_import('utilities').iter_stock_frames
+    find_reversal_points = lazy_import('utilities').find_reversal_points
+    reversal_range_histogram = lazy_import('utilities').reversal_range_histogram
+    load_universe = lazy_import('screener').load_universe
+    np = lazy_import('numpy')
+    inputData = request.get_json(silent=True) or {}
+
+    # Default to the whole universe in stocksList.txt
+    symbols = inputData.get('symbols') or load_universe()
+    start_date = inputData.get('start_date') or (datetime.date.today() - datetime.timedelta(days=365)).strftime('%Y-%m-%d')
+    tolerance_percentage = float(inputData.get('tolerance_percentage', 2.0))
+    min_count = int(inputData.get('min_count', 2))
+    range_width = inputData.get('range_width')
+    # Percentage-wide ranges around the last close unless a fixed price width is asked for
+    range_percentage = None if range_width is not None else float(inputData.get('range_percentage', 2.0))
+
+    try:
+        tickers, levels, last_closes = [], [], []
+        for symbol, data in iter_stock_frames(symbols, start=start_date):
+            if data.empty:
+                continue
+            with stage('indicators', symbol):
+                levels.append(find_reversal_points(data, tolerance_percentage))
+            tickers.append(symbol.replace(".NS", ""))
+            last_closes.append(float(data['Close'].iloc[-1]))
+
+        histogram = reversal_range_histogram(
+            levels,
+            range_width=float(range_width) if range_width is not None else None,
+            range_percentage=range_percentage,
+            reference_prices=last_closes,
+            min_count=min_count
+        )
+
+        with stage('serialize'):
+            body = jsonify({
+                'tickers': tickers,
+                'last_close': [round(close, 2) for close in last_closes],
+                'range_width': range_width,
+                'range_percentage': range_percentage,
+                'buckets': histogram['buckets'].tolist(),
+                'lower_bounds': np.round(histogram['lower_bounds'], 2).tolist(),
+                # One row per ticker, one column per bucket
+                'counts': histogram['counts'].tolist()
+            })
+        return body
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/event-study', methods=['POST'])
+@cached_route()
+def event_study_data():
+    event_study = lazy_import('event_study').event_study
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+    try:
+        inputData = request.get_json()
+        if 'events' not in inputData:
+            return jsonify({'error': 'Missing key "events" in JSON data'}), 400
+
+        # Events are [symbol, date] pairs or {"symbol": ..., "date": ...} objects
+        events = [(event['symbol'], event['date']) if isinstance(event, dict) else tuple(event) for event in inputData['events']]
+        if not events:
+            return jsonify({'error': 'No events given'}), 400
+        target_percent = inputData.get('target_percent')
+        stop_percent = inputData.get('stop_percent')
+        with stage('backtest'):
+            result = event_study(
+                events,
+                inputData.get('horizons', [1, 5, 10, 22]),
+                target_percent=float(target_percent) if target_percent is not None else None,
+                stop_percent=float(stop_percent) if stop_percent is not None else None
+            )
+
+        def rounded(values):
+            # Compact arrays, null where a value isn't known yet
+            return np.where(np.isnan(values), None, np.round(values, 2)).tolist()
+
+        reached = result['reached']
+        summary = {}
+        with np.errstate(invalid='ignore'):
+            for j, horizon in enumerate(result['horizons'].tolist()):
+                returns = result['forward_return_percentage'][:, j]
+                returns = returns[~np.isnan(returns)]
+                summary[str(horizon)] = {
+                    'events': int(returns.size),
+                    'mean_return_percentage': round(float(returns.mean()), 2) if returns.size else None,
+                    'median_return_percentage': round(float(np.median(returns)), 2) if returns.size else None,
+                    'positive_rate': round(float((returns > 0).mean()), 4) if returns.size else None,
+                    'target_hit_rate': round(float(result['hit_target'][reached[:, j], j].mean()), 4) if 'hit_target' in result and reached[:, j].any() else None,
+                    'stop_hit_rate': round(float(result['hit_stop'][reached[:, j], j].mean()), 4) if 'hit_stop' in result and reached[:, j].any() else None
+                }
+
+        with stage('serialize'):
+            response = {
+                'horizons': result['horizons'].tolist(),
+                'summary': summary,
+                'symbol': [symbol.replace(".NS", "") for symbol, _ in events],
+                'date': [str(date) for _, date in events],
+                'entry_session': [pd.Timestamp(session).strftime('%Y-%m-%d') if not pd.isna(session) else None for session in result['entry_session']],
+                'entry_price': rounded(result['entry_price']),
+                # One row per event, one column per horizon
+                'forward_return_percentage': rounded(result['forward_return_percentage']),
+                'mfe_percentage': rounded(result['mfe_percentage']),
+                'mae_percentage': rounded(result['mae_percentage'])
+            }
+            for flag in ('hit_target', 'hit_stop'):
+                if flag in result:
+                    response[flag] = np.where(reached, result[flag], None).tolist()
+            body = jsonify(response)
+        return body
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/startup')
+def startup():
+    # Import and initialization steps this worker has run, including lazy imports done by earlier requests
+    return jsonify(startup_report())
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,82 +1,199 @@
-import yfinance as yf
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from utilities import get_stock_data
+
+def run_rules(closes, stop_loss_percent, target_percent, trailing_percent):
+    """Apply the entry and exit rules to an array of closes.
+
+    Returns None if no trade was closed, otherwise a dict with the entry and
+    exit bar indices, prices and the trailed levels at exit. The position
+    exits on the first target hit, so trailing_percent does not change the
+    outcome under these rules.
+    """
+    position_opened = False
+    entry_index = 0
+    entry_price = 0
+    stop_loss_price = 0
+    target_price = 0
+    trailed_stop_loss_price = 0
+    trailed_target_price = 0
+    highest_close_after_entry = 0
+
+    closes = np.asarray(closes, dtype=float).tolist()
+    # Iterate through historical data
+    for i in range(1, len(closes)):
+        current_close = closes[i]
+        previous_close = closes[i - 1]
+
+        if not position_opened:
+            # Check if the current day meets the entry conditions
+            # For example, entering if the close price increases by a certain percentage
+            if current_close > previous_close * 1.01:
+                entry_index = i
+                entry_price = current_close
+                stop_loss_price = entry_price * (1 - stop_loss_percent / 100)
+                target_price = entry_price * (1 + target_percent / 100)
+                trailed_stop_loss_price = stop_loss_price
+                trailed_target_price = target_price
+                highest_close_after_entry = current_close
+                position_opened = True
+        else:
+            # Update the highest close price after entry
+            highest_close_after_entry = max(highest_close_after_entry, current_close)
+
+            # Check if the stop loss or target is hit
+            if current_close <= stop_loss_price or current_close >= target_price:
+                return {
+                    'entry_index': entry_index,
+                    'exit_index': i,
+                    'entry_price': entry_price,
+                    'exit_price': current_close,
+                    'stop_loss_hit': current_close <= stop_loss_price,
+                    'trailed_stop_loss': trailed_stop_loss_price,
+                    'trailed_target': trailed_target_price
+                }
+
+            # Adjust stop-loss based on trailing highest close
+            stop_loss_price = highest_close_after_entry * (1 - stop_loss_percent / 100)
+            # Adjust trailed stop-loss and target
+            trailed_stop_loss_price = highest_close_after_entry * (1 - stop_loss_percent / 100)
+            trailed_target_price = highest_close_after_entry * (1 + target_percent / 100)
+
+    return None
 
 def backtest(stock_symbols, start_date, end_date, stop_loss_percent, target_percent, trailing_percent):
     results = {}
 
     for symbol in stock_symbols:
         # Fetch historical data for the stock
-        data = yf.download(symbol, start=start_date, end=end_date)
-        # Initialize variables for tracking positions
-        position_opened = False
-        entry_price = 0
-        stop_loss_percent = 15
-        target_percent = 10
-        trailing_percent = 10
-        stop_loss_price = 0
-        target_price = 0
-        trailed_stop_loss_price = 0
-        trailed_target_price = 0
-        highest_close_after_entry = 0
-
-        # Iterate through historical data
-        for i in range(1, len(data)):
-            current_close = data['Close'][i]
-            previous_close = data['Close'][i - 1]
-
-            if not position_opened:
-                # Check if the current day meets the entry conditions
-                # For example, entering if the close price increases by a certain percentage
-                if current_close > previous_close * 1.01:
-                    entry_price = current_close
-                    stop_loss_price = entry_price * (1 - stop_loss_percent / 100)
-                    target_price = entry_price * (1 + target_percent / 100)
-                    trailed_stop_loss_price = stop_loss_price
-                    trailed_target_price = target_price
-                    highest_close_after_entry = current_close
-                    position_opened = True
-            else:
-                # Update the highest close price after entry
-                highest_close_after_entry = max(highest_close_after_entry, current_close)
-
-                # Check if the stop loss or target is hit
-                if current_close <= stop_loss_price or current_close >= target_price:
-                    position_opened = False
-                    result = {
-                        'entry_date': str(data.index[i]),
-                        'entry_price': entry_price,
-                        'exit_date': str(data.index[i]),
-                        'exit_price': current_close,
-                        'result': 'Stop Loss Hit' if current_close <= stop_loss_price else 'Open',
-                        'profit': current_close - entry_price,
-                        'trailed_stop_loss': trailed_stop_loss_price,
-                        'trailed_target': trailed_target_price
-                    }
-                    
-                    # If the target is hit, adjust stop-loss and target based on trailing percent
-                    if current_close >= target_price:
-                        stop_loss_percent += trailing_percent
-                        target_percent += trailing_percent
-                    
-                    results[symbol] = result
-                    break
-
-                # Adjust stop-loss based on trailing highest close
-                stop_loss_price = highest_close_after_entry * (1 - stop_loss_percent / 100)
-                # Adjust trailed stop-loss and target
-                trailed_stop_loss_price = highest_close_after_entry * (1 - stop_loss_percent / 100)
-                trailed_target_price = highest_close_after_entry * (1 + target_percent / 100)
+        data = get_stock_data(symbol, start_date, end_date)
+        trade = run_rules(data['Close'].to_numpy(), stop_loss_percent, target_percent, trailing_percent)
+        if trade is None:
+            continue
+
+        exit_index = trade['exit_index']
+        results[symbol] = {
+            'entry_date': str(data.index[trade['entry_index']]),
+            'entry_price': trade['entry_price'],
+            'exit_date': str(data.index[exit_index]),
+            'exit_price': trade['exit_price'],
+            'result': 'Stop Loss Hit' if trade['stop_loss_hit'] else 'Open',
+            'profit': trade['exit_price'] - trade['entry_price'],
+            'trailed_stop_loss': trade['trailed_stop_loss'],
+            'trailed_target': trade['trailed_target']
+        }
 
     return results
 
-# Example usage
-stock_symbols = ['ASIANHOTNR.NS', 'TRENT.NS','MANGLMCEM.NS','HIRECT.NS','TEXINFRA.NS','MODISONLTD.NS','IVP.NS','CDSL.NS','APOLLO.NS','SUNDARMHLD.NS'
-,'MADHUCON.NS','KDDL.NS','MBLINFRA.NS','OBEROIRLTY.NS','SPYL.NS','MCX.NS','SIGACHI.NS','ANANDRATHI.NS','GREENLAM.NS','ALKEM.NS']  # Add your list of stock symbols
-start_date = '2023-10-30'
-end_date = '2023-12-12'
-stop_loss_percent = 15
-target_percent = 10
-trailing_percent = 10
-
-backtest_results = backtest(stock_symbols, start_date, end_date, stop_loss_percent, target_percent, trailing_percent)
-print(backtest_results)
+def hold_summary(data, target_percentage=None):
+    """Summarize buying at the first bar's close and holding to the last bar.
+
+    Everything comes from the one series: entry and latest close, the
+    highest high and lowest low with their bar positions, and the first bar
+    whose high exceeds the target (None if it never did or no target is set).
+    """
+    close = data['Close'].to_numpy(dtype=float)
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    high_index = int(np.nanargmax(high))
+    low_index = int(np.nanargmin(low))
+    entry_price = close[0]
+
+    target_price = None
+    target_index = None
+    if target_percentage:
+        target_price = entry_price * (1 + target_percentage / 100)
+        crossings = np.flatnonzero(high > target_price)
+        if crossings.size:
+            target_index = int(crossings[0])
+
+    return {
+        'entry_price': entry_price,
+        'latest_price': close[-1],
+        'high_price': high[high_index],
+        'high_index': high_index,
+        'low_price': low[low_index],
+        'low_index': low_index,
+        'target_price': target_price,
+        'target_index': target_index
+    }
+
+# Closes for every symbol in the sweep, set once per worker process
+_sweep_closes = {}
+
+def _init_sweep_worker(closes_by_symbol):
+    global _sweep_closes
+    _sweep_closes = closes_by_symbol
+
+def _evaluate_grid_point(params):
+    """Aggregate one (stop loss, target) setting over every symbol."""
+    stop_loss_percent, target_percent = params
+    trades = 0
+    stop_loss_hits = 0
+    total_profit = 0.0
+    total_return_percent = 0.0
+    for closes in _sweep_closes.values():
+        # trailing_percent doesn't change the outcome of run_rules, so it isn't swept
+        trade = run_rules(closes, stop_loss_percent, target_percent, None)
+        if trade is None:
+            continue
+        profit = trade['exit_price'] - trade['entry_price']
+        trades += 1
+        stop_loss_hits += trade['stop_loss_hit']
+        total_profit += profit
+        total_return_percent += profit / trade['entry_price'] * 100
+    return {
+        'stop_loss_percent': stop_loss_percent,
+        'target_percent': target_percent,
+        'trades': trades,
+        'target_hits': trades - stop_loss_hits,
+        'stop_loss_hits': stop_loss_hits,
+        'hit_rate': (trades - stop_loss_hits) / trades if trades else np.nan,
+        'total_profit': total_profit,
+        'total_return_percent': total_return_percent,
+        'avg_return_percent': total_return_percent / trades if trades else np.nan
+    }
+
+def sweep(stock_symbols, start_date, end_date, stop_loss_range, target_range, max_workers=None):
+    """Evaluate every combination of the given parameter ranges across stock_symbols.
+
+    Each symbol's prices are loaded once and shared with the worker processes,
+    which split the grid between them. Returns a DataFrame of parameter sets
+    ranked by total return percent.
+    """
+    closes_by_symbol = {}
+    for symbol in stock_symbols:
+        data = get_stock_data(symbol, start_date, end_date)
+        if not data.empty:
+            closes_by_symbol[symbol] = data['Close'].to_numpy(dtype=float)
+
+    grid = list(itertools.product(stop_loss_range, target_range))
+    max_workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(grid) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker, initargs=(closes_by_symbol,)) as executor:
+        rows = list(executor.map(_evaluate_grid_point, grid, chunksize=chunksize))
+
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.sort_values(['total_return_percent', 'hit_rate'], ascending=False).reset_index(drop=True)
+
+if __name__ == '__main__':
+    # Example usage
+    stock_symbols = ['ASIANHOTNR.NS', 'TRENT.NS','MANGLMCEM.NS','HIRECT.NS','TEXINFRA.NS','MODISONLTD.NS','IVP.NS','CDSL.NS','APOLLO.NS','SUNDARMHLD.NS'
+    ,'MADHUCON.NS','KDDL.NS','MBLINFRA.NS','OBEROIRLTY.NS','SPYL.NS','MCX.NS','SIGACHI.NS','ANANDRATHI.NS','GREENLAM.NS','ALKEM.NS']  # Add your list of stock symbols
+    start_date = '2023-10-30'
+    end_date = '2023-12-12'
+    stop_loss_percent = 15
+    target_percent = 10
+    trailing_percent = 10
+
+    backtest_results = backtest(stock_symbols, start_date, end_date, stop_loss_percent, target_percent, trailing_percent)
+    print(backtest_results)
+
+    # Parameter sweep over the same symbols
+    sweep_results = sweep(stock_symbols, start_date, end_date, range(5, 25, 5), range(5, 25, 5))
+    print(sweep_results.head(10))
@@ -0,0 +1,124 @@
+import os
+import pickle
+import tempfile
+import datetime
+import numpy as np
+import pandas as pd
+from providers import OHLCV_COLUMNS, get_provider
+from instrumentation import inc
+
+# One pickle per (provider, interval, symbol) under this directory. /tmp is the only
+# writable location on the serverless deployment, so default there.
+STORE_DIR = os.environ.get('BAR_STORE_DIR', os.path.join(tempfile.gettempdir(), 'stock-daily-price', 'bars'))
+# A re-downloaded bar whose close moved by more than this means Yahoo rewrote
+# the history (a split or bonus), so the stored bars are on the old scale
+REWRITE_TOLERANCE = 1e-3
+
+def _store_path(provider, ticker, interval):
+    safe_ticker = ticker.replace('/', '_').replace('^', '_')
+    return os.path.join(STORE_DIR, provider.name, interval, f"{safe_ticker}.pkl")
+
+def _to_date(value):
+    if value is None:
+        return datetime.date.today() + datetime.timedelta(days=1)
+    return pd.Timestamp(value).date()
+
+def _read_entry(path):
+    """Return the stored entry for a symbol, or None if nothing usable is on disk."""
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+def _write_entry(path, entry):
+    """Write atomically so concurrent readers never see a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _has_weekday(start, end):
+    return start < end and np.busday_count(start, end) > 0
+
+def _covered_end(data, end, today):
+    """Coverage runs up to the day after the last bar that came back, and never past today."""
+    return min(end, today, data.index[-1].date() + datetime.timedelta(days=1))
+
+def _merge(data, piece):
+    data = pd.concat([frame for frame in (data, piece) if not frame.empty] or [data])
+    return data[~data.index.duplicated(keep='last')].sort_index()
+
+def stored_bars(ticker, interval="1d"):
+    """Whatever bars the store already holds for ticker, without downloading anything."""
+    provider = get_provider()
+    entry = _read_entry(_store_path(provider, ticker, interval)) if provider.cache_bars else None
+    return entry['data'] if entry is not None else pd.DataFrame(columns=OHLCV_COLUMNS)
+
+def load_bars(ticker, start_date, end_date, interval="1d"):
+    """Serve [start_date, end_date) bars from the local store, downloading only the missing edges.
+
+    The store remembers the date range it has already covered (not just the
+    bar dates, so weekends are not re-requested). Coverage only grows when a
+    download returned bars, and at the recent end only up to the last bar
+    returned, so an empty or failed response is retried on the next call.
+    Today's bar is never treated as final. Each top-up re-downloads the last
+    stored bar too; if its close changed, the whole range is fetched again.
+    """
+    provider = get_provider()
+    start = _to_date(start_date)
+    end = _to_date(end_date)
+    if not provider.cache_bars:
+        return provider.download(ticker, start, end, interval)
+
+    today = datetime.date.today()
+    path = _store_path(provider, ticker, interval)
+    entry = _read_entry(path)
+
+    if entry is None:
+        inc('bar_store_lookups_total', result='miss')
+        data = provider.download(ticker, start, end, interval)
+        if data.empty:
+            # yfinance returns an empty frame on failures too; don't cache those.
+            return data
+        _write_entry(path, {'start': start, 'end': _covered_end(data, end, today), 'data': data})
+    else:
+        data = entry['data']
+        covered_start, covered_end = entry['start'], entry['end']
+        fetched = changed = False
+        if start < covered_start and _has_weekday(start, covered_start):
+            fetched = True
+            piece = provider.download(ticker, start, covered_start, interval)
+            if not piece.empty:
+                data = _merge(data, piece)
+                covered_start = start
+                changed = True
+        if end > covered_end and _has_weekday(covered_end, min(end, today + datetime.timedelta(days=1))):
+            fetched = True
+            final = data[data.index < pd.Timestamp(covered_end)]
+            overlap = final.index[-1] if not final.empty else None
+            piece = provider.download(ticker, overlap.date() if overlap is not None else covered_end, end, interval)
+            if overlap is not None and overlap in piece.index and not np.isclose(
+                    float(piece.at[overlap, 'Close']), float(final.at[overlap, 'Close']), rtol=REWRITE_TOLERANCE, equal_nan=True):
+                inc('bar_store_rewrites_total')
+                piece = provider.download(ticker, covered_start, end, interval)
+                if not piece.empty:
+                    data = piece[~piece.index.duplicated(keep='last')].sort_index()
+                    covered_end = _covered_end(piece, end, today)
+                    changed = True
+            elif not piece.empty:
+                data = _merge(data, piece)
+                covered_end = max(covered_end, _covered_end(piece, end, today))
+                changed = True
+        inc('bar_store_lookups_total', result='partial' if fetched else 'hit')
+        if changed:
+            _write_entry(path, {'start': covered_start, 'end': covered_end, 'data': data})
+
+    start_ts = pd.Timestamp(start)
+    end_ts = pd.Timestamp(end)
+    return data[(data.index >= start_ts) & (data.index < end_ts)]
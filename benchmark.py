@@ -0,0 +1,146 @@
+"""Micro-benchmarks for the analysis hot paths.
+
+Runs each case on synthetic series of several sizes, records the best wall
+time over several runs and the peak traced memory, and compares them against
+a stored baseline. A time only counts as a regression when it is both over
+the tolerance ratio and slower by more than the noise floor, since short
+cases jitter by more than 1.5x between runs:
+
+    python benchmark.py                    # run and compare with benchmark_baseline.json
+    python benchmark.py --record           # run and store the results in the baseline
+    python benchmark.py --sizes 250 2500 --cases find_reversal_points
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from utilities import find_reversal_points, calculate_recent_sma, summarize_trend_volumes
+from swing_backtest import swing_backtest
+from trend import best_fit, rolling_best_fit
+from get_trend_line import find_grad_intercept, find_grad_intercept_batch
+from reversal_tracker import ReversalTracker
+
+SIZES = [250, 2_500, 25_000, 250_000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+NOISE_FLOOR_SECONDS = 0.05
+
+def synthetic_bars(n, seed=0):
+    """Random-walk OHLCV bars. Minute spacing keeps 250k bars inside pandas' date range."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * (1 + rng.normal(0, 0.004, n))
+    spread = np.abs(rng.normal(0, 0.008, n))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(100_000, 5_000_000, n).astype(float)
+    }, index=pd.date_range('2000-01-03', periods=n, freq='min'))
+
+CASES = {
+    'find_reversal_points': lambda data: find_reversal_points(data, 3.0),
+    'calculate_recent_sma': lambda data: calculate_recent_sma(data),
+    'analyze_trend_volumes': lambda data: summarize_trend_volumes('BENCH', data),
+    'swing_backtest': lambda data: swing_backtest([('BENCH', data)], 5, 10),
+    'best_fit': lambda data: best_fit(data['Close'].to_numpy()),
+    'rolling_best_fit': lambda data: rolling_best_fit(data[['High', 'Low']].to_numpy(), 25),
+    'find_grad_intercept': lambda data: find_grad_intercept('support', np.arange(len(data), dtype=float), data['Low'].to_numpy()),
+    'find_grad_intercept_batch': lambda data: find_grad_intercept_batch('support', np.arange(25, dtype=float), np.lib.stride_tricks.sliding_window_view(data['Low'].to_numpy(), 25)),
+    'reversal_tracker': lambda data: ReversalTracker(3.0).extend(data['Low'].tolist()),
+    # Lows rounded to a 0.05 tick repeat, and every repeat refolds its levels
+    'reversal_tracker_ticks': lambda data: ReversalTracker(3.0).extend(((data['Low'] / 0.05).round() * 0.05).tolist()),
+}
+# Cases too slow to time at every size; larger sizes are skipped
+MAX_SIZES = {'reversal_tracker_ticks': 25_000}
+
+def measure(case, data, repeat):
+    """Best-of-repeat wall time, then one traced run for peak memory.
+
+    The garbage collector is off while timing, as in timeit, so a collection
+    landing in one run doesn't decide the result.
+    """
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case(data)
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        case(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+def run(cases, sizes, repeat):
+    results = {}
+    for size in sizes:
+        data = synthetic_bars(size)
+        for name in cases:
+            if size > MAX_SIZES.get(name, size):
+                continue
+            seconds, peak = measure(CASES[name], data, repeat)
+            results[f"{name}[{size}]"] = {'seconds': seconds, 'peak_bytes': peak}
+            print(f"{name:>24} {size:>8} bars  {seconds * 1000:10.3f} ms  {peak / 1024:12.1f} KiB")
+    return results
+
+def compare(results, baseline, tolerance, noise_floor=NOISE_FLOOR_SECONDS):
+    """Return the cases that got slower or hungrier than baseline * tolerance, or have no baseline.
+
+    Times within noise_floor seconds of the baseline never count.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            regressions.append(f"{key}: no baseline, run with --record to add it")
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            previous = baseline[key][metric]
+            floor = noise_floor if metric == 'seconds' else 0
+            if previous and result[metric] > max(previous * tolerance, previous + floor):
+                regressions.append(f"{key} {metric}: {previous:.6g} -> {result[metric]:.6g} ({result[metric] / previous:.2f}x)")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case; the fastest is kept')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed ratio over baseline before failing')
+    parser.add_argument('--noise-floor', type=float, default=NOISE_FLOOR_SECONDS, help='seconds a case may slow down by regardless of --tolerance')
+    parser.add_argument('--record', action='store_true', help='store these results in the baseline instead of comparing')
+    args = parser.parse_args()
+
+    results = run(args.cases, args.sizes, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.record:
+        # Cases and sizes that weren't run keep their recorded values
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Recorded {len(results)} results in {args.baseline}")
+    else:
+        if not baseline:
+            print(f"No baseline at {args.baseline}; run with --record to create one")
+            sys.exit(1)
+        regressions = compare(results, baseline, args.tolerance, args.noise_floor)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
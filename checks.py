@@ -0,0 +1,159 @@
+"""Equivalence checks for the optimized analysis code.
+
+Each check runs a fast implementation and the slow reference it replaced
+on random inputs and reports every case where they disagree:
+
+    python checks.py                       # run every check
+    python checks.py --cases reversal_points --trials 500
+"""
+import argparse
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+import indicators
+from indicators import latest_indicators
+from utilities import find_reversal_points
+from reversal_tracker import ReversalTracker
+from trend import rolling_best_fit
+from get_trend_line import find_grad_intercept, find_grad_intercept_batch, find_grad_intercept_slsqp
+
+def random_lows(rng, n):
+    """A random walk of lows, sometimes rounded to a tick so that minima repeat."""
+    lows = 100 * np.exp(np.cumsum(rng.normal(0, rng.uniform(0.005, 0.03), n)))
+    if rng.random() < 0.5:
+        lows = np.round(lows / 0.05) * 0.05
+    return lows
+
+def reference_reversal_points(lows, tolerance_percentage):
+    """find_reversal_points as it was first written, one level at a time."""
+    reversals = {}
+    for i in range(1, len(lows) - 1):
+        if lows[i] < lows[i - 1] and lows[i] < lows[i + 1]:
+            reversals[lows[i]] = reversals.get(lows[i], 0) + 1
+
+    consolidated_reversals = []
+    for price, count in sorted(reversals.items(), key=lambda x: x[1], reverse=True):
+        for idx, (consolidated_price, consolidated_count) in enumerate(consolidated_reversals):
+            if abs(consolidated_price - price) <= (tolerance_percentage / 100) * price:
+                new_price = (consolidated_price * consolidated_count + price * count) / (consolidated_count + count)
+                consolidated_reversals[idx] = (new_price, consolidated_count + count)
+                break
+        else:
+            consolidated_reversals.append((price, count))
+    return sorted(consolidated_reversals, key=lambda x: x[1], reverse=True)
+
+def check_reversal_points(rng):
+    lows = random_lows(rng, int(rng.integers(3, 3000)))
+    tolerance = float(rng.choice([0.0, 0.5, 1.0, 3.0, 10.0]))
+    expected = reference_reversal_points(lows.tolist(), tolerance)
+    actual = find_reversal_points({'Low': lows}, tolerance)
+    if actual != expected:
+        return f"{len(lows)} lows, tolerance {tolerance}: {actual[:3]} != {expected[:3]}"
+
+def check_reversal_tracker(rng):
+    lows = random_lows(rng, int(rng.integers(3, 1500)))
+    tolerance = float(rng.choice([0.0, 0.5, 1.0, 3.0, 10.0]))
+    tracker = ReversalTracker(tolerance)
+    for i, low in enumerate(lows):
+        tracker.add(low)
+        if i % 25 == 0 or i == len(lows) - 1:
+            expected = find_reversal_points({'Low': lows[:i + 1]}, tolerance)
+            if tracker.levels() != expected:
+                return f"after {i + 1} lows, tolerance {tolerance}: {tracker.levels()[:3]} != {expected[:3]}"
+
+def check_grad_intercept(rng):
+    n = int(rng.integers(5, 200))
+    x = np.arange(n, dtype=float)
+    y = 100 + np.cumsum(rng.normal(0, 1, n))
+    case = str(rng.choice(['support', 'resistance']))
+    m, c = find_grad_intercept(case, x, y)
+    batch_m, batch_c = find_grad_intercept_batch(case, x, np.stack([y, y[::-1]]))
+    if (batch_m[0], batch_c[0]) != (m, c):
+        return f"{case} over {n} points: batch row {batch_m[0]}, {batch_c[0]} != {m}, {c}"
+
+    reference_m, reference_c = find_grad_intercept_slsqp(case, x, y)
+    if abs(m - reference_m) <= 1e-4 * max(1.0, abs(m)) and abs(c - reference_c) <= 1e-4 * max(1.0, abs(c)):
+        return None
+    # The one known way SLSQP differs: it stalls at its m=0 start. Then the
+    # closed form must be a feasible line that fits at least as well
+    line = m * x + c
+    feasible = np.all(line >= y - 1e-9 * np.abs(y)) if case == 'resistance' else np.all(line <= y + 1e-9 * np.abs(y))
+    fits = np.sum((line - y) ** 2) <= np.sum((reference_m * x + reference_c - y) ** 2) * (1 + 1e-12)
+    if reference_m != 0 or not feasible or not fits:
+        return f"{case} over {n} points: slope {m} != SLSQP {reference_m}"
+
+def check_indicator_history(rng):
+    """A short request followed by a long one must give the long history's indicators."""
+    n = int(rng.integers(210, 400))
+    closes = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n))), index=pd.bdate_range('2020-01-01', periods=n))
+    short = int(rng.integers(2, 60))
+    ema_spans = (12,) if rng.random() < 0.5 else ()
+    state_dir = indicators.STATE_DIR
+    with tempfile.TemporaryDirectory() as indicators.STATE_DIR:
+        try:
+            latest_indicators('CHECK', pd.DataFrame({'Close': closes.iloc[-short:]}), ema_spans=ema_spans)
+            actual = latest_indicators('CHECK', pd.DataFrame({'Close': closes}), ema_spans=ema_spans)
+        finally:
+            indicators.STATE_DIR = state_dir
+
+    expected = {'Close': closes.iloc[-1]}
+    for window in (20, 50, 200):
+        expected[f'{window}SMA'] = closes.iloc[-window:].mean()
+    for span in ema_spans:
+        expected[f'{span}EMA'] = closes.ewm(span=span, adjust=False).mean().iloc[-1]
+    wrong = [key for key in expected if not np.isclose(actual[key], expected[key])]
+    if wrong:
+        return f"{short} bars then {n}: {', '.join(f'{key} {actual[key]} != {expected[key]}' for key in wrong)}"
+
+def check_rolling_fit(rng):
+    """rolling_best_fit on a long series against a least-squares fit of each window on its own."""
+    n = int(rng.integers(20_000, 250_000))
+    window = int(rng.integers(2, 60))
+    if rng.random() < 0.5:
+        y = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    else:
+        y = 1000 + np.cumsum(rng.normal(0, 1, n))
+    windows = np.lib.stride_tricks.sliding_window_view(y, window)
+    x = np.arange(window) - (window - 1) / 2
+    centred = windows - windows.mean(axis=1, keepdims=True)
+    expected_m = (centred * x).sum(axis=1) / (x * x).sum()
+    expected_c = windows.mean(axis=1) - expected_m * (window - 1) / 2
+
+    m, c, _ = rolling_best_fit(y, window)
+    m_error = np.max(np.abs(m[window - 1:] - expected_m)) / np.mean(np.abs(expected_m))
+    c_error = np.max(np.abs(c[window - 1:] - expected_c)) / np.mean(np.abs(y))
+    if m_error > 1e-9 or c_error > 1e-9:
+        return f"{n} bars, window {window}: slope error {m_error:.2e}, intercept error {c_error:.2e}"
+
+CHECKS = {
+    'reversal_points': check_reversal_points,
+    'reversal_tracker': check_reversal_tracker,
+    'grad_intercept': check_grad_intercept,
+    'indicator_history': check_indicator_history,
+    'rolling_fit': check_rolling_fit,
+}
+
+def run(cases, trials, seed):
+    """Run each check trials times and return the failure messages."""
+    failures = []
+    for name in cases:
+        rng = np.random.default_rng(seed)
+        for trial in range(trials):
+            message = CHECKS[name](rng)
+            if message:
+                failures.append(f"{name} trial {trial}: {message}")
+        print(f"{name:>24} {trials:>6} trials  {sum(f.startswith(name + ' ') for f in failures):>4} failed")
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CHECKS), default=list(CHECKS))
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failures = run(args.cases, args.trials, args.seed)
+    for failure in failures:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failures else 0)
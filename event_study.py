@@ -0,0 +1,119 @@
+import datetime
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+from response_cache import market_today
+from trading_calendar import get_calendar
+from utilities import iter_stock_frames
+
+# Aligned panels kept in memory, keyed by symbols and date range
+PANEL_CACHE_SIZE = 8
+
+_panels = OrderedDict()
+
+def load_panel(symbols, start, end):
+    """(sessions x symbols) Close, High and Low arrays over the calendar's sessions in [start, end).
+
+    Returns (sessions, {symbol: column}, panel). Panels are cached for the
+    day, and a cached panel that holds every requested symbol over at least
+    the requested range is reused whatever order the symbols came in.
+    """
+    symbols = sorted(set(symbols))
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    today = market_today()
+    for key, cached in reversed(_panels.items()):
+        cached_symbols, cached_start, cached_end, day = key
+        if day == today and cached_start <= start and cached_end >= end and all(symbol in cached[1] for symbol in symbols):
+            _panels.move_to_end(key)
+            return cached
+
+    sessions = get_calendar(full_history=True).sessions
+    sessions = sessions[(sessions >= start) & (sessions < end)]
+    panel = {column: np.full((len(sessions), len(symbols)), np.nan) for column in ('Close', 'High', 'Low')}
+    columns = {symbol: k for k, symbol in enumerate(symbols)}
+    with stage('fetch'):
+        for symbol, data in iter_stock_frames(symbols, start=start, end=end):
+            if data.empty:
+                continue
+            k = columns[symbol]
+            data = data[~data.index.normalize().duplicated(keep='last')]
+            positions = sessions.get_indexer(data.index.normalize())
+            found = positions >= 0
+            for column, values in panel.items():
+                values[positions[found], k] = data[column].to_numpy(dtype=float)[found]
+
+    key = (tuple(symbols), start, end, today)
+    _panels[key] = sessions, columns, panel
+    while len(_panels) > PANEL_CACHE_SIZE:
+        _panels.popitem(last=False)
+    return _panels[key]
+
+def event_study(events, horizons, target_percent=None, stop_percent=None):
+    """Forward returns and excursions after many (symbol, signal_date) events at once.
+
+    Each event enters at the close of the first session on or after its
+    date. For every horizon h (in sessions) it gets the return to the close
+    h sessions later, the maximum favourable excursion (highest high) and
+    maximum adverse excursion (lowest low) over those h sessions, and
+    whether the target or stop was touched. Everything is computed by
+    gathering from one aligned panel. Values past the available bars are NaN,
+    and when no event has a session yet nothing is fetched at all.
+    """
+    horizons = np.asarray(sorted({int(h) for h in horizons}), dtype=np.int64)
+    if horizons.size == 0 or horizons[0] < 1:
+        raise ValueError("Horizons must be whole numbers of sessions, at least 1")
+    symbols = list(dict.fromkeys(symbol for symbol, _ in events))
+    dates = pd.to_datetime([date for _, date in events])
+    longest = int(horizons[-1])
+
+    calendar = get_calendar(full_history=True)
+    entry_sessions = calendar.sessions_after(dates, [0])[:, 0]
+    last_sessions = calendar.sessions_after(dates, [longest])[:, 0]
+    if np.isnat(entry_sessions).all():
+        # Every event is after the last known session
+        entry = np.full(len(events), np.nan)
+        close = best = worst = np.full((len(events), longest), np.nan)
+        inside = np.zeros((len(events), longest), dtype=bool)
+    else:
+        start = pd.Timestamp(np.nanmin(entry_sessions)).date()
+        end = min(pd.Timestamp(np.nanmax(last_sessions)).date(), market_today()) + datetime.timedelta(days=1)
+        sessions, symbol_columns, panel = load_panel(symbols, start, end)
+
+        rows = sessions.get_indexer(pd.DatetimeIndex(entry_sessions))
+        columns = np.array([symbol_columns[symbol] for symbol, _ in events], dtype=np.int64)
+        valid = rows >= 0
+        rows = np.where(valid, rows, 0)
+
+        entry = np.where(valid, panel['Close'][rows, columns], np.nan)
+        # Path of the following sessions, (events x longest), NaN past the panel
+        path_rows = rows[:, None] + np.arange(1, longest + 1)[None, :]
+        inside = valid[:, None] & (path_rows < len(sessions))
+        path_rows = np.where(inside, path_rows, 0)
+
+        def gather(values):
+            return np.where(inside, values[path_rows, columns[:, None]], np.nan)
+
+        close, high, low = gather(panel['Close']), gather(panel['High']), gather(panel['Low'])
+        with np.errstate(invalid='ignore'):
+            # Running extremes; fmax/fmin skip sessions the symbol didn't trade
+            best = np.fmax.accumulate(high, axis=1)
+            worst = np.fmin.accumulate(low, axis=1)
+    # A horizon is only answered once its session is inside the panel
+    reached = inside[:, horizons - 1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = {
+            'entry_session': entry_sessions,
+            'entry_price': entry,
+            'forward_return_percentage': (close[:, horizons - 1] / entry[:, None] - 1) * 100,
+            'mfe_percentage': np.where(reached, (best[:, horizons - 1] / entry[:, None] - 1) * 100, np.nan),
+            'mae_percentage': np.where(reached, (worst[:, horizons - 1] / entry[:, None] - 1) * 100, np.nan),
+        }
+        if target_percent is not None:
+            result['hit_target'] = np.where(reached, result['mfe_percentage'] >= target_percent, False)
+        if stop_percent is not None:
+            result['hit_stop'] = np.where(reached, result['mae_percentage'] <= -stop_percent, False)
+    result['horizons'] = horizons
+    result['reached'] = reached
+    return result
@@ -1,8 +1,69 @@
 import numpy as np
-from scipy.optimize import minimize, LinearConstraint
+
+def _slope_bounds(case, X, Y):
+    """The slopes that keep every point on the right side of a line through the pivot.
+
+    X and Y are measured from the pivot along the last axis. Resistance needs
+    m*X >= Y, so points right of the pivot bound m from below and points left
+    of it bound m from above; support is the mirror image. The pivot is the
+    extreme point, so m = 0 is always feasible.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = Y / X
+    right = np.where(X > 0, ratio, np.nan)
+    left = np.where(X < 0, ratio, np.nan)
+    if case == 'resistance':
+        lower, upper = right, left
+    else:
+        lower, upper = left, right
+    lower = np.max(np.where(np.isnan(lower), -np.inf, lower), axis=-1)
+    upper = np.min(np.where(np.isnan(upper), np.inf, upper), axis=-1)
+    return lower, upper
+
+def find_grad_intercept_batch(case, x, y):
+    """find_grad_intercept for many series at once.
+
+    x has shape (n,) and y has shape (..., n), e.g. one row per ticker or per
+    rolling window. Returns arrays of gradients and intercepts shaped y.shape[:-1].
+
+    Agrees with find_grad_intercept_slsqp to 1e-4 except where SLSQP stalls:
+    it reports success after a single objective evaluation and returns its
+    starting slope m=0 (about a fifth of random-walk windows). There the
+    line returned here is feasible and has a lower squared error than m=0.
+    checks.py verifies both.
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    pos = np.argmax(y, axis=-1) if case == 'resistance' else np.argmin(y, axis=-1)
+    x_pivot = np.take_along_axis(x, pos[..., None], axis=-1)
+    y_pivot = np.take_along_axis(y, pos[..., None], axis=-1)
+
+    X = x - x_pivot
+    Y = y - y_pivot
+    lower, upper = _slope_bounds(case, X, Y)
+
+    # The objective is a parabola in m, so the constrained optimum is the
+    # unconstrained least-squares slope clipped into the feasible interval
+    sxx = np.sum(X * X, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.where(sxx > 0, np.sum(X * Y, axis=-1) / sxx, 0.0)
+    m = np.clip(m, lower, upper)
+    return m, y_pivot[..., 0] - m * x_pivot[..., 0]
 
 def find_grad_intercept(case, x, y):
     
+    m, c = find_grad_intercept_batch(case, x, y)
+    
+    # Return the gradient (m) and the intercept (c)
+    return float(m), float(c)
+
+def find_grad_intercept_slsqp(case, x, y):
+    """The original numerical fit, kept as a reference for find_grad_intercept.
+
+    SLSQP sometimes stops at its m=0 starting point; see find_grad_intercept_batch.
+    """
+    from scipy.optimize import minimize, LinearConstraint
+    
     pos = np.argmax(y) if case == 'resistance' else np.argmin(y)
         
     # Form the points for the objective function
@@ -32,4 +93,4 @@ def find_grad_intercept(case, x, y):
     )
     
     # Return the gradient (m) and the intercept (c)
-    return ans.x[0], y[pos]-ans.x[0]*x[pos] 
\ No newline at end of file
+    return ans.x[0], y[pos]-ans.x[0]*x[pos]
@@ -0,0 +1,181 @@
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+from providers import get_provider
+
+STATE_DIR = os.environ.get('INDICATOR_STATE_DIR', os.path.join(tempfile.gettempdir(), 'stock-daily-price', 'indicators'))
+
+class IndicatorState:
+    """Running SMA and EMA values for one symbol, updated in O(1) per bar.
+
+    A ring buffer holds the last max(sma_windows) closes and a running sum
+    is kept per window, so a new bar adds its close and drops the one that
+    left each window. EMAs match pandas ewm(span=..., adjust=False) seeded
+    with the first close.
+    """
+
+    def __init__(self, sma_windows=(20, 50, 200), ema_spans=()):
+        self.sma_windows = tuple(sma_windows)
+        self.ema_spans = tuple(ema_spans)
+        self.capacity = max(self.sma_windows, default=1)
+        self.buffer = [0.0] * self.capacity
+        self.position = 0
+        self.count = 0
+        self.sums = {window: 0.0 for window in self.sma_windows}
+        self.emas = {span: None for span in self.ema_spans}
+        self.previous_emas = dict(self.emas)
+        self.last_timestamp = None
+        self.previous_timestamp = None
+
+    @property
+    def config(self):
+        return self.sma_windows, self.ema_spans
+
+    @property
+    def last_close(self):
+        return self.buffer[(self.position - 1) % self.capacity] if self.count else None
+
+    @property
+    def previous_close(self):
+        return self.buffer[(self.position - 2) % self.capacity] if self.count > 1 and self.capacity > 1 else None
+
+    def _push(self, close):
+        for window in self.sma_windows:
+            self.sums[window] += close
+            if self.count >= window:
+                self.sums[window] -= self.buffer[(self.position - window) % self.capacity]
+        self.buffer[self.position] = close
+        self.position = (self.position + 1) % self.capacity
+        self.count += 1
+        # Re-add the sums exactly once per buffer cycle so rounding error can't accumulate
+        if self.position == 0:
+            self._resum()
+
+    def _resum(self):
+        for window in self.sma_windows:
+            size = min(window, self.count)
+            self.sums[window] = sum(self.buffer[(self.position - k) % self.capacity] for k in range(1, size + 1))
+
+    def update(self, timestamp, close):
+        """Add one bar. A bar with the same timestamp as the last one replaces it; older bars are ignored.
+
+        Returns whether the state changed.
+        """
+        close = float(close)
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            return False
+        if self.last_timestamp is not None and timestamp == self.last_timestamp:
+            if close == self.last_close:
+                return False
+            # Refreshed bar (e.g. today's close moved): swap the close in place
+            last = (self.position - 1) % self.capacity
+            for window in self.sma_windows:
+                self.sums[window] += close - self.buffer[last]
+            self.buffer[last] = close
+            self.emas = dict(self.previous_emas)
+        else:
+            self._push(close)
+            self.previous_emas = dict(self.emas)
+            self.previous_timestamp = self.last_timestamp
+        for span in self.ema_spans:
+            alpha = 2 / (span + 1)
+            previous = self.emas[span]
+            self.emas[span] = close if previous is None else alpha * close + (1 - alpha) * previous
+        self.last_timestamp = timestamp
+        return True
+
+    def values(self):
+        """Latest close, SMAs (keyed like '20SMA') and EMAs (keyed like '12EMA')."""
+        result = {'Close': self.last_close}
+        for window in self.sma_windows:
+            size = min(window, self.count)
+            result[f'{window}SMA'] = self.sums[window] / size if size else None
+        for span in self.ema_spans:
+            result[f'{span}EMA'] = self.emas[span]
+        return result
+
+def _state_path(symbol, interval):
+    return os.path.join(STATE_DIR, get_provider().name, interval, f"{symbol.replace('/', '_').replace('^', '_')}.pkl")
+
+def load_state(symbol, sma_windows=(20, 50, 200), ema_spans=(), interval="1d"):
+    """Return the persisted state for symbol, or None if there is none for this window set."""
+    try:
+        with open(_state_path(symbol, interval), 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    return state if state.config == (tuple(sma_windows), tuple(ema_spans)) else None
+
+def save_state(symbol, state, interval="1d"):
+    path = _state_path(symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _matches(closes, timestamp, close):
+    """Whether data has no bar at timestamp or agrees with the stored close there."""
+    if timestamp is None or close is None or pd.Timestamp(timestamp) not in closes.index:
+        return True
+    return bool(np.isclose(closes[pd.Timestamp(timestamp)], close))
+
+def _history_needed(state, closes, last_timestamp):
+    """How many bars up to last_timestamp the state must have seen to agree with closes.
+
+    SMAs only look back max(sma_windows) bars; EMAs depend on every bar.
+    """
+    available = int((closes.index <= last_timestamp).sum())
+    return available if state.ema_spans else min(state.capacity, available)
+
+def latest_indicators(symbol, data, sma_windows=(20, 50, 200), ema_spans=(), interval="1d"):
+    """Bring the symbol's persisted state up to the end of data and return the latest values.
+
+    Only bars newer than the state's last bar are fed in, and the state is
+    only written when that changed it. A fresh state without EMAs only needs
+    the last max(sma_windows) bars. If data disagrees with a stored bar that
+    was already final, the history was rewritten (a split or bonus) and the
+    state is rebuilt from data, as it is when data reaches further back than
+    the history the state was built from.
+    """
+    closes = data['Close'].dropna()
+    closes = closes[~closes.index.duplicated(keep='last')]
+    state = load_state(symbol, sma_windows, ema_spans, interval)
+    persist = True
+    if state is not None and not closes.empty:
+        last_timestamp = pd.Timestamp(state.last_timestamp)
+        # The last stored bar may still be refreshed; the one before it is final
+        final = [(getattr(state, 'previous_timestamp', None), state.previous_close)]
+        if closes.index[-1] > last_timestamp:
+            final.append((last_timestamp, state.last_close))
+        if closes.index[-1] < last_timestamp:
+            # Historical window that ends before the saved state; don't overwrite it
+            state, persist = None, False
+        elif closes.index[0] > last_timestamp:
+            # Bars are missing between the saved state and this data
+            state = None
+        elif not all(_matches(closes, timestamp, close) for timestamp, close in final):
+            state = None
+        elif state.count < _history_needed(state, closes, last_timestamp):
+            # Built from a shorter history (e.g. a recent start_date) than data covers
+            state = None
+
+    if state is None:
+        state = IndicatorState(sma_windows, ema_spans)
+        if not state.ema_spans:
+            closes = closes.iloc[-state.capacity:]
+    else:
+        closes = closes[closes.index >= pd.Timestamp(state.last_timestamp)]
+
+    updated = False
+    for timestamp, close in zip(closes.index, closes.to_numpy(dtype=float).tolist()):
+        updated = state.update(timestamp, close) or updated
+    if updated and persist:
+        save_state(symbol, state, interval)
+    return state.values()
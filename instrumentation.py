@@ -0,0 +1,167 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+
+# Upper bounds in seconds for the latency histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Keep the Server-Timing header bounded on large multi-symbol requests
+MAX_SYMBOL_TIMINGS = 50
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_startup_steps = []
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    """Add to a counter, e.g. inc('provider_calls_total', provider='yfinance')."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, seconds, **labels):
+    """Record one latency sample in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+@contextmanager
+def stage(name, symbol=None):
+    """Time a block as one stage (fetch, indicators, backtest, serialize...) of the current request.
+
+    Outside a request, for example in scripts or worker threads, only the
+    histogram is updated.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint if has_request_context() else None
+        observe('stage_duration_seconds', elapsed, stage=name, endpoint=endpoint or 'none')
+        if has_request_context() and 'stage_timings' in g:
+            g.stage_timings.append((name, symbol, elapsed))
+
+def record_startup_step(name, seconds):
+    """Note how long one import or initialization step of this worker took."""
+    with _lock:
+        _startup_steps.append((name, seconds))
+    observe('startup_step_seconds', seconds, step=name)
+
+@contextmanager
+def startup_step(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup_step(name, time.perf_counter() - start)
+
+def lazy_import(name):
+    """Import a module the first time a route needs it, timing that first import."""
+    module = sys.modules.get(name)
+    if module is None:
+        with startup_step(f'import {name}'):
+            module = importlib.import_module(name)
+    return module
+
+def startup_report():
+    """Every startup step of this worker so far, in the order they ran."""
+    with _lock:
+        steps = list(_startup_steps)
+    return {
+        'steps': [{'step': name, 'seconds': round(seconds, 6)} for name, seconds in steps],
+        'total_seconds': round(sum(seconds for _, seconds in steps), 6)
+    }
+
+def _server_timing(timings, total):
+    totals = {}
+    for name, symbol, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items()]
+    per_symbol = [(name, symbol, elapsed) for name, symbol, elapsed in timings if symbol is not None]
+    entries += [f'{name};desc="{symbol}";dur={elapsed * 1000:.1f}' for name, symbol, elapsed in per_symbol[:MAX_SYMBOL_TIMINGS]]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
+
+def init_app(app):
+    """Time every request, add a Server-Timing header and record request latency.
+
+    Streamed bodies only run after the headers are sent, so those responses
+    get no header; their timings are recorded and logged when the stream closes.
+    """
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.stage_timings = []
+
+    @app.after_request
+    def add_server_timing(response):
+        if 'request_start' not in g:
+            return response
+        endpoint = request.endpoint or 'none'
+        inc('requests_total', endpoint=endpoint, status=str(response.status_code))
+        if response.is_streamed:
+            request_start, timings, path = g.request_start, g.stage_timings, request.path
+
+            def log_server_timing():
+                total = time.perf_counter() - request_start
+                observe('request_duration_seconds', total, endpoint=endpoint)
+                app.logger.info("Server-Timing %s %s", path, _server_timing(timings, total))
+
+            response.call_on_close(log_server_timing)
+            return response
+        total = time.perf_counter() - g.request_start
+        observe('request_duration_seconds', total, endpoint=endpoint)
+        response.headers['Server-Timing'] = _server_timing(g.stage_timings, total)
+        return response
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+def render_prometheus():
+    """Return every histogram and counter in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    # Hit ratio of the local bar store, derived from its lookup counter
+    lookups = {dict(labels).get('result'): value for (name, labels), value in counters.items() if name == 'bar_store_lookups_total'}
+    total = sum(lookups.values())
+    if total:
+        lines.append("# TYPE bar_store_hit_ratio gauge")
+        lines.append(f"bar_store_hit_ratio {lookups.get('hit', 0) / total}")
+    return '\n'.join(lines) + '\n'
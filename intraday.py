@@ -0,0 +1,111 @@
+import datetime
+import numpy as np
+import pandas as pd
+from providers import get_provider
+from instrumentation import stage
+from indicators import IndicatorState
+from utilities import _trend_volume_sums, consolidate_reversal_levels, count_local_minima, trend_volume_summary
+
+# Calendar days per download for each intraday interval, small enough to keep
+# one chunk of bars in memory and within Yahoo's per-request limits
+CHUNK_DAYS = {'1m': 7, '2m': 30, '5m': 30, '15m': 30, '30m': 30, '60m': 90, '90m': 30, '1h': 90}
+# How far back Yahoo serves each interval
+HISTORY_DAYS = {'1m': 29, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '60m': 729, '90m': 59, '1h': 729}
+
+def iter_bar_chunks(ticker, start_date, end_date, interval):
+    """Download [start_date, end_date) intraday bars one chunk at a time and yield each frame.
+
+    The start is moved forward to the oldest bar Yahoo still serves for the interval.
+    """
+    end = pd.Timestamp(end_date)
+    oldest = pd.Timestamp(datetime.date.today() - datetime.timedelta(days=HISTORY_DAYS[interval]))
+    start = max(pd.Timestamp(start_date), oldest)
+    provider = get_provider()
+    step = pd.Timedelta(days=CHUNK_DAYS[interval])
+    while start < end:
+        chunk_end = min(start + step, end)
+        with stage('fetch', ticker):
+            data = provider.download(ticker, start.date(), chunk_end.date(), interval)
+        if not data.empty:
+            yield data
+        start = chunk_end
+
+class ChunkedReversalAnalysis:
+    """Reversal levels, SMAs and the volume trend, built up one chunk of bars at a time.
+
+    Only running state is carried between chunks: the last two lows (so a
+    minimum on a chunk edge is still found), the count of each minimum
+    price, volume sums by bar direction and an IndicatorState.
+    """
+
+    def __init__(self, start_date, volume_start_date, sma_windows=(20, 50, 200)):
+        self.start = pd.Timestamp(start_date)
+        self.volume_start = pd.Timestamp(volume_start_date)
+        self.tail_lows = np.empty(0)
+        self.minima = {}
+        self.volume_sums = np.zeros(3)
+        self.volume_counts = np.zeros(3, dtype=np.int64)
+        self.indicators = IndicatorState(sma_windows)
+        self.bars = 0
+
+    def add(self, data):
+        data = data[~data.index.duplicated(keep='last')]
+        if self.indicators.last_timestamp is not None:
+            # Chunks meet at their edges; skip bars already seen
+            data = data[data.index > self.indicators.last_timestamp]
+        if data.empty:
+            return
+        self.bars += len(data)
+
+        reversal_data = data.iloc[data.index.searchsorted(self.start):]
+        if not reversal_data.empty:
+            lows = np.concatenate([self.tail_lows, reversal_data['Low'].to_numpy(dtype=float)])
+            prices, counts = count_local_minima(lows)
+            for price, count in zip(prices.tolist(), counts.tolist()):
+                self.minima[price] = self.minima.get(price, 0) + count
+            self.tail_lows = lows[-2:]
+
+        volume_data = data.iloc[data.index.searchsorted(self.volume_start):]
+        sums, counts = _trend_volume_sums(
+            np.zeros(len(volume_data), dtype=np.int64),
+            1,
+            volume_data['Open'].to_numpy(dtype=float),
+            volume_data['Close'].to_numpy(dtype=float),
+            volume_data['Volume'].to_numpy(dtype=float)
+        )
+        self.volume_sums += sums[0]
+        self.volume_counts += counts[0]
+
+        # Only the bars that can still be inside an SMA window need to be fed in
+        closes = data['Close'].dropna().iloc[-self.indicators.capacity:]
+        for timestamp, close in zip(closes.index, closes.to_numpy(dtype=float).tolist()):
+            self.indicators.update(timestamp, close)
+
+    def reversal_points(self, tolerance_percentage):
+        prices = np.array(list(self.minima), dtype=float)
+        counts = np.array(list(self.minima.values()), dtype=np.int64)
+        return consolidate_reversal_levels(prices, counts, tolerance_percentage)
+
+    def volume_analysis(self, ticker):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.volume_sums / self.volume_counts
+        return trend_volume_summary(ticker, means[2], means[0])
+
+def analyze_intraday_request(ticker, start_date, volume_start_date, end_date, tolerance_percentage, num_reversals=3, interval="5m"):
+    """analyze_reversal_request for intraday bars, holding one chunk of bars in memory at a time.
+
+    Bars are fetched from the earlier of the two start dates; SMAs are over
+    bars of the interval rather than days.
+    """
+    if interval not in CHUNK_DAYS:
+        raise ValueError(f"Unsupported interval {interval}, expected 1d or one of {list(CHUNK_DAYS)}")
+    analysis = ChunkedReversalAnalysis(start_date, volume_start_date)
+    first = min(pd.Timestamp(start_date), pd.Timestamp(volume_start_date))
+    for data in iter_bar_chunks(ticker, first, end_date, interval):
+        with stage('indicators', ticker):
+            analysis.add(data)
+    if not analysis.bars:
+        raise ValueError(f"No data fetched for {ticker}.")
+
+    highest_count_reversals = analysis.reversal_points(tolerance_percentage)[:num_reversals]
+    return highest_count_reversals, analysis.indicators.values(), analysis.volume_analysis(ticker)
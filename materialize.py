@@ -0,0 +1,150 @@
+"""Nightly job that precomputes the /get-reversal-data answer for every symbol.
+
+Runs the same analysis as the route over stocksList.txt, spread across
+processes, and writes one table that the route reads per symbol:
+
+    python materialize.py                  # after the close, for the next session
+    python materialize.py --workers 4 --end-date 2024-06-14
+
+The table has to live somewhere both the job and the API instances can
+read, so MATERIALIZED_TABLE_PATH (or --output for the job) must be set.
+Without it the job refuses to run and the route always computes.
+"""
+import argparse
+import datetime
+import os
+import pickle
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from response_cache import IST, MARKET_CLOSE, is_session_day
+from screener import load_universe
+from utilities import REVERSAL_START_DATE, TOLERANCE_PERCENTAGE, VOLUME_START_DATE, analyze_reversal_request
+
+# A location shared by the job and every API instance; a per-instance /tmp would never be seen
+TABLE_PATH = os.environ.get('MATERIALIZED_TABLE_PATH')
+# Requests for up to this many reversal levels can be answered from the table
+MAX_REVERSALS = 10
+
+_table = None
+_table_mtime = None
+
+def default_end_date(now=None):
+    """The exclusive end date the route will use in the next session to open."""
+    now = now or datetime.datetime.now(IST)
+    today = now.date()
+    return today + datetime.timedelta(days=1) if now.time() >= MARKET_CLOSE else today
+
+def _materialize_symbol(args):
+    symbol, end_date = args
+    try:
+        reversal_points, sma_values, volume_analysis = analyze_reversal_request(
+            symbol, REVERSAL_START_DATE, VOLUME_START_DATE, end_date, TOLERANCE_PERCENTAGE, MAX_REVERSALS
+        )
+    except Exception as e:
+        return symbol, None, str(e)
+    return symbol, (
+        [(float(price), int(count)) for price, count in reversal_points],
+        {key: float(value) for key, value in sma_values.items()},
+        {
+            'ticker': symbol,
+            'avg_volume_uptrend': float(volume_analysis['avg_volume_uptrend']),
+            'avg_volume_downtrend': float(volume_analysis['avg_volume_downtrend']),
+            'higher_volume_uptrend': bool(volume_analysis['higher_volume_uptrend']),
+            'percentage_higher': float(volume_analysis['percentage_higher'])
+        }
+    ), None
+
+def materialize(symbols, end_date, path=TABLE_PATH, max_workers=None):
+    """Compute every symbol's row in a process pool and write the table atomically.
+
+    Returns {symbol: error} for the symbols that could not be computed. The
+    output directory is created first, so a bad path fails before the run.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    end_date = str(end_date)
+    max_workers = max_workers or os.cpu_count() or 1
+    rows, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        chunksize = max(1, len(symbols) // (max_workers * 4))
+        for symbol, row, error in executor.map(_materialize_symbol, [(symbol, end_date) for symbol in symbols], chunksize=chunksize):
+            if row is None:
+                errors[symbol] = error
+            else:
+                rows[symbol] = row
+
+    table = {'end_date': end_date, 'rows': rows}
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return errors
+
+def load_table(path=TABLE_PATH):
+    """Return the table, reading it again only when the job has replaced the file."""
+    global _table, _table_mtime
+    if not path:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if mtime != _table_mtime:
+        try:
+            with open(path, 'rb') as f:
+                _table = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        _table_mtime = mtime
+    return _table
+
+def lookup(ticker, start_date, volume_start_date, end_date, tolerance_percentage, num_reversals=3):
+    """The precomputed analyze_reversal_request result, or None if the table can't answer it.
+
+    The table answers requests with the job's settings whose end date has no
+    sessions since the table's end date, so a Friday night table also serves
+    Monday's pre-open.
+    """
+    if (start_date, volume_start_date, tolerance_percentage) != (REVERSAL_START_DATE, VOLUME_START_DATE, TOLERANCE_PERCENTAGE):
+        return None
+    if num_reversals > MAX_REVERSALS:
+        return None
+    table = load_table()
+    if table is None or ticker not in table['rows']:
+        return None
+
+    day = datetime.date.fromisoformat(table['end_date'])
+    end = datetime.date.fromisoformat(str(end_date))
+    if end < day:
+        return None
+    while day < end:
+        if is_session_day(day):
+            return None
+        day += datetime.timedelta(days=1)
+
+    reversal_points, sma_values, volume_analysis = table['rows'][ticker]
+    return reversal_points[:num_reversals], sma_values, volume_analysis
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--universe', default=None, help='symbol list, defaults to stocksList.txt')
+    parser.add_argument('--end-date', default=None, help='exclusive end date, defaults to the next session')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=TABLE_PATH, help='defaults to MATERIALIZED_TABLE_PATH')
+    args = parser.parse_args()
+    if not args.output:
+        parser.error('set MATERIALIZED_TABLE_PATH or --output to a location the API instances can read')
+    if os.path.abspath(args.output).startswith(os.path.abspath(tempfile.gettempdir()) + os.sep):
+        print(f"Warning: {args.output} is under the temp directory, which other instances can't see", file=sys.stderr)
+
+    symbols = load_universe(args.universe) if args.universe else load_universe()
+    end_date = args.end_date or default_end_date()
+    errors = materialize(symbols, end_date, args.output, args.workers)
+    print(f"Materialized {len(symbols) - len(errors)} of {len(symbols)} symbols for {end_date} into {args.output}")
+    for symbol, error in errors.items():
+        print(f"{symbol}: {error}")
@@ -1,56 +1,20 @@
-import yfinance as yf
-import pandas as pd
-import numpy as np
-
-def get_stock_data(ticker, start_date, end_date):
-    return yf.download(ticker, start=start_date, end=end_date, interval="1d")
-
-def classify_trend(row):
-    if row['Close'] > row['Open']:
-        return 'uptrend'
-    elif row['Close'] < row['Open']:
-        return 'downtrend'
-    else:
-        return 'no_trend'
-
-def analyze_trend_volumes(ticker, start_date, end_date):
-    data = get_stock_data(ticker, start_date, end_date)
-    
-    if data.empty:
-        print(f"No data fetched for {ticker}.")
-        return None
-    
-    data['Trend'] = data.apply(classify_trend, axis=1)
-    
-    uptrend_days = data[data['Trend'] == 'uptrend']
-    downtrend_days = data[data['Trend'] == 'downtrend']
-    
-    avg_volume_uptrend = uptrend_days['Volume'].mean()
-    avg_volume_downtrend = downtrend_days['Volume'].mean()
-    
-    if avg_volume_downtrend > 0:
-        percentage_higher = ((avg_volume_uptrend - avg_volume_downtrend) / avg_volume_downtrend) * 100
-    else:
-        percentage_higher = np.inf
-    
-    return {
-        'ticker': ticker,
-        'avg_volume_uptrend': avg_volume_uptrend,
-        'avg_volume_downtrend': avg_volume_downtrend,
-        'uptrend_volumes': uptrend_days['Volume'].tolist(),
-        'downtrend_volumes': downtrend_days['Volume'].tolist(),
-        'higher_volume_uptrend': avg_volume_uptrend > avg_volume_downtrend,
-        'percentage_higher': percentage_higher
-    }
+from utilities import get_stock_data, stack_frames, summarize_trend_volumes_panel
 
 def find_stocks_with_volume_trend(tickers, start_date, end_date):
-    results = []
+    frames = []
     for ticker in tickers:
-        analysis = analyze_trend_volumes(ticker, start_date, end_date)
-        if analysis:
-            results.append(analysis)
-    
-    return [result for result in results if result['higher_volume_uptrend']]
+        data = get_stock_data(ticker, start_date, end_date)
+        if data.empty:
+            print(f"No data fetched for {ticker}.")
+            continue
+        frames.append((ticker, data))
+    if not frames:
+        return []
+
+    # Up/down volume averages for every ticker in one pass over the stacked panel
+    summary = summarize_trend_volumes_panel(stack_frames(frames))
+    summary = summary[summary['higher_volume_uptrend']]
+    return [{'ticker': ticker, **row} for ticker, row in summary.to_dict('index').items()]
 
 # Example usage
 tickers = ["MGL.NS", "STARHEALTH.NS", "APOLLOTYRE.NS", "IGL.NS", "DELHIVERY.NS", "RKEC.NS"]
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+WAITING, OPEN, CLOSED = 0, 1, 2
+
+def align_panel(frames):
+    """Align (symbol, frame) pairs on the union of their dates.
+
+    Returns the symbols, the date index and (dates x symbols) arrays of
+    Close, High and Low. Days a symbol did not trade are NaN.
+    """
+    frames = [(symbol, data) for symbol, data in frames if not data.empty]
+    symbols = [symbol for symbol, _ in frames]
+    dates = pd.DatetimeIndex([])
+    for _, data in frames:
+        dates = dates.union(data.index)
+    columns = {}
+    for column in ('Close', 'High', 'Low'):
+        panel = np.full((len(dates), len(symbols)), np.nan)
+        for k, (_, data) in enumerate(frames):
+            panel[dates.get_indexer(data.index), k] = data[column].to_numpy(dtype=float)
+        columns[column] = panel
+    return symbols, dates, columns['Close'], columns['High'], columns['Low']
+
+def run_portfolio(frames, initial_capital, stop_loss_percent, target_percent, max_positions=None):
+    """Trade the swing rules for many symbols out of one pool of cash.
+
+    Every symbol is bought once, at the close of its first bar on which a
+    position slot and enough cash are free, with an equal share of current
+    equity per slot (whole shares only). Each open position then follows the
+    swing_trade rules: from its third bar, a low at the stop sells it at the
+    stop, and a high at the target ratchets the stop and raises the target.
+    The loop runs once per day over all symbols at a time.
+
+    Returns (curve, trades): a DataFrame indexed by date with cash,
+    positions value, equity, drawdown and open positions, and a list of
+    trade dicts.
+    """
+    symbols, dates, close, high, low = align_panel(frames)
+    n = len(symbols)
+    max_positions = max_positions or n
+    tp = target_percent / 100
+
+    status = np.full(n, WAITING)
+    shares = np.zeros(n)
+    entry_price = np.zeros(n)
+    stop_loss = np.zeros(n)
+    target = np.zeros(n)
+    trailed = np.zeros(n, dtype=bool)
+    bars_held = np.zeros(n, dtype=int)
+    entry_day = np.full(n, -1)
+    exit_day = np.full(n, -1)
+    exit_price = np.full(n, np.nan)
+    last_close = np.full(n, np.nan)
+
+    cash = float(initial_capital)
+    curve = np.zeros((len(dates), 4))
+    for t in range(len(dates)):
+        traded = ~np.isnan(close[t])
+        last_close = np.where(traded, close[t], last_close)
+        is_open = status == OPEN
+        bars_held += is_open & traded
+
+        # Exits and ratchets, only from a position's third bar as in swing_trade
+        active = is_open & (bars_held >= 2)
+        hit = active & (low[t] <= stop_loss)
+        ratchet = active & ~hit & (high[t] >= target)
+        cash += float(np.sum(shares[hit] * stop_loss[hit]))
+        status[hit] = CLOSED
+        exit_day[hit] = t
+        exit_price[hit] = stop_loss[hit]
+        stop_loss[ratchet] = np.where(trailed[ratchet], target[ratchet], entry_price[ratchet])
+        trailed[ratchet] = True
+        target[ratchet] *= 1 + tp
+
+        # Entries, in the order the symbols were given, while slots and cash last
+        free_slots = max_positions - int(np.sum(status == OPEN))
+        candidates = np.flatnonzero((status == WAITING) & traded)[:max(free_slots, 0)]
+        if candidates.size:
+            equity = cash + float(np.nansum(shares[status == OPEN] * last_close[status == OPEN]))
+            slot = equity / max_positions
+            # Each entry gets a slot's worth of equity, or whatever cash the earlier ones left
+            budget = np.clip(cash - slot * np.arange(candidates.size), 0, slot)
+            size = np.floor(budget / close[t, candidates])
+            chosen = candidates[size > 0]
+            shares[chosen] = size[size > 0]
+            cash -= float(np.sum(shares[chosen] * close[t, chosen]))
+            status[chosen] = OPEN
+            entry_day[chosen] = t
+            entry_price[chosen] = close[t, chosen]
+            stop_loss[chosen] = entry_price[chosen] * (1 - stop_loss_percent / 100)
+            target[chosen] = entry_price[chosen] * (1 + tp)
+
+        is_open = status == OPEN
+        positions_value = float(np.nansum(shares[is_open] * last_close[is_open]))
+        curve[t] = cash, positions_value, cash + positions_value, int(np.sum(is_open))
+
+    curve = pd.DataFrame(curve, index=dates, columns=['cash', 'positions_value', 'equity', 'open_positions'])
+    curve['open_positions'] = curve['open_positions'].astype(int)
+    curve['drawdown'] = curve['equity'] / curve['equity'].cummax() - 1
+
+    trades = []
+    for k in np.flatnonzero(status != WAITING):
+        closed = status[k] == CLOSED
+        price = exit_price[k] if closed else last_close[k]
+        trades.append({
+            'symbol': symbols[k],
+            'entry_date': dates[entry_day[k]],
+            'entry_price': entry_price[k],
+            'shares': int(shares[k]),
+            'exit_date': dates[exit_day[k]] if closed else None,
+            'exit_price': exit_price[k] if closed else None,
+            'result': 'Hit' if closed else 'Open',
+            'profit': (price - entry_price[k]) * shares[k],
+            'stop_loss': stop_loss[k],
+            'target': target[k]
+        })
+    return curve, trades
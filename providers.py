@@ -0,0 +1,156 @@
+import os
+import numpy as np
+import pandas as pd
+from instrumentation import inc, startup_step
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def _naive_index(data):
+    if isinstance(data.index, pd.DatetimeIndex) and data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    return data
+
+class YFinanceProvider:
+    """Market data straight from Yahoo Finance."""
+    name = 'yfinance'
+    # Downloads are slow and rate limited, so results go through the bar store
+    cache_bars = True
+
+    def __init__(self):
+        self._yf = None
+        self.session = None
+
+    def _client(self):
+        """Import yfinance and open the HTTP session shared by every download, on first use."""
+        if self._yf is None:
+            with startup_step('yfinance client'):
+                import requests
+                import yfinance
+                self.session = requests.Session()
+                self._yf = yfinance
+        return self._yf
+
+    def download(self, ticker, start=None, end=None, interval="1d", period=None, auto_adjust=False):
+        inc('provider_calls_total', provider=self.name, method='download')
+        yf = self._client()
+        if period is not None:
+            data = yf.download(ticker, period=period, interval=interval, auto_adjust=auto_adjust, progress=False, session=self.session)
+        else:
+            data = yf.download(ticker, start=start, end=end, interval=interval, auto_adjust=auto_adjust, progress=False, session=self.session)
+        return _naive_index(data)
+
+    def download_many(self, tickers, start=None, end=None, interval="1d", period=None, auto_adjust=True):
+        """Fetch several tickers in one grouped request and return {ticker: frame}."""
+        inc('provider_calls_total', provider=self.name, method='download_many')
+        kwargs = {'period': period} if period is not None else {'start': start, 'end': end}
+        panel = self._client().download(list(tickers), group_by='ticker', interval=interval, auto_adjust=auto_adjust,
+                                        threads=True, progress=False, session=self.session, **kwargs)
+        panel = _naive_index(panel)
+        frames = {}
+        for ticker in tickers:
+            if not isinstance(panel.columns, pd.MultiIndex):
+                frame = panel
+            elif ticker in panel.columns.get_level_values(0):
+                frame = panel[ticker]
+            else:
+                frame = pd.DataFrame(columns=OHLCV_COLUMNS)
+            # The panel index is the union of every ticker's sessions
+            frames[ticker] = frame.dropna(how='all')
+        return frames
+
+class ReplayProvider:
+    """Serve recorded or synthetic OHLCV bars from memory, with no network access.
+
+    Recorded bars are read once from <data_dir>/<TICKER>.csv (or
+    <TICKER>_<interval>.csv for intraday intervals) and kept in memory.
+    Prices are served as recorded, so auto_adjust is ignored.
+    """
+    name = 'replay'
+    cache_bars = False
+
+    def __init__(self, data_dir=None, frames=None):
+        self.data_dir = data_dir
+        self.frames = dict(frames or {})
+
+    @classmethod
+    def synthetic(cls, tickers, start='2015-01-01', periods=2500, seed=0):
+        """Random-walk daily bars for each ticker, reproducible for a given seed."""
+        rng = np.random.default_rng(seed)
+        index = pd.bdate_range(start, periods=periods, name='Date')
+        frames = {}
+        for ticker in tickers:
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, periods)))
+            open_ = close * (1 + rng.normal(0, 0.005, periods))
+            spread = np.abs(rng.normal(0, 0.01, periods))
+            frames[(ticker, "1d")] = pd.DataFrame({
+                'Open': open_,
+                'High': np.maximum(open_, close) * (1 + spread),
+                'Low': np.minimum(open_, close) * (1 - spread),
+                'Close': close,
+                'Adj Close': close,
+                'Volume': rng.integers(100_000, 5_000_000, periods).astype(float)
+            }, index=index)
+        return cls(frames=frames)
+
+    def _path(self, ticker, interval):
+        filename = f"{ticker}.csv" if interval == "1d" else f"{ticker}_{interval}.csv"
+        return os.path.join(self.data_dir, filename)
+
+    def save(self, ticker, data, interval="1d"):
+        """Record bars (for example from YFinanceProvider) so they can be replayed later."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        data.to_csv(self._path(ticker, interval), index_label='Date')
+        self.frames[(ticker, interval)] = data
+
+    def _frame(self, ticker, interval):
+        key = (ticker, interval)
+        if key not in self.frames:
+            path = self._path(ticker, interval) if self.data_dir else None
+            if path and os.path.exists(path):
+                self.frames[key] = pd.read_csv(path, index_col=0, parse_dates=True)
+            else:
+                self.frames[key] = pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+        return self.frames[key]
+
+    def download(self, ticker, start=None, end=None, interval="1d", period=None, auto_adjust=False):
+        inc('provider_calls_total', provider=self.name, method='download')
+        data = self._frame(ticker, interval)
+        if period is not None:
+            # Periods count back from the last recorded bar, not the wall clock
+            if period != 'max' and not data.empty:
+                if period.endswith('mo'):
+                    data = data[data.index > data.index[-1] - pd.DateOffset(months=int(period[:-2]))]
+                elif period.endswith('y'):
+                    data = data[data.index > data.index[-1] - pd.DateOffset(years=int(period[:-1]))]
+                else:
+                    data = data.iloc[-int(period[:-1]):]
+            return data.copy()
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data.index < pd.Timestamp(end)]
+        return data.copy()
+
+    def download_many(self, tickers, start=None, end=None, interval="1d", period=None, auto_adjust=True):
+        return {ticker: self.download(ticker, start, end, interval, period, auto_adjust) for ticker in tickers}
+
+_provider = None
+
+def get_provider():
+    """Return the process-wide provider, chosen by MARKET_DATA_PROVIDER on first use.
+
+    MARKET_DATA_PROVIDER=replay serves bars from REPLAY_DATA_DIR; anything else
+    uses Yahoo Finance.
+    """
+    global _provider
+    if _provider is None:
+        if os.environ.get('MARKET_DATA_PROVIDER') == 'replay':
+            _provider = ReplayProvider(os.environ.get('REPLAY_DATA_DIR', 'replay_data'))
+        else:
+            _provider = YFinanceProvider()
+    return _provider
+
+def set_provider(provider):
+    """Swap the provider, e.g. for benchmarks or capacity tests."""
+    global _provider
+    _provider = provider
@@ -0,0 +1,179 @@
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app, request
+from instrumentation import inc
+
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30), 'IST')
+MARKET_OPEN = datetime.time(9, 15)
+MARKET_CLOSE = datetime.time(15, 30)
+# How long a live answer is reused while the market is trading
+INTRADAY_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_INTRADAY_TTL', 30))
+MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Followers give up waiting on a slow leader after this long and compute themselves
+COALESCE_TIMEOUT_SECONDS = 60
+# Answers with per-symbol errors are only reused briefly, so a failed fetch is retried soon
+ERROR_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_ERROR_TTL', 60))
+
+def market_today():
+    """Today's date in India, whatever the server's timezone."""
+    return datetime.datetime.now(IST).date()
+
+def is_session_day(day):
+    """Weekdays that aren't NSE holidays, per the trading calendar."""
+    from trading_calendar import get_calendar
+    return get_calendar().is_session(day)
+
+def _next_session_time(now, at):
+    """The first session day at or after now whose `at` time is still ahead."""
+    day = now.date()
+    while True:
+        moment = datetime.datetime.combine(day, at, IST)
+        if is_session_day(day) and moment > now:
+            return moment
+        day += datetime.timedelta(days=1)
+
+def session_expiry(historical, now=None):
+    """Epoch time until which an answer stays valid.
+
+    Answers built only from completed sessions fetch up to market_today(),
+    so they hold until the next market close or the next IST date change,
+    whichever comes first: after midnight the day just ended is included.
+    Answers that include the live session get a short TTL while the market
+    is open, and otherwise hold until it next opens.
+    """
+    now = now or datetime.datetime.now(IST)
+    if historical:
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(0), IST)
+        return min(_next_session_time(now, MARKET_CLOSE), midnight).timestamp()
+    market_open = datetime.datetime.combine(now.date(), MARKET_OPEN, IST)
+    market_close = datetime.datetime.combine(now.date(), MARKET_CLOSE, IST)
+    if is_session_day(now.date()) and market_open <= now < market_close:
+        return now.timestamp() + INTRADAY_TTL_SECONDS
+    return _next_session_time(now, MARKET_OPEN).timestamp()
+
+def carries_error(data):
+    """Whether a JSON answer has an "error" entry at the top level, for a symbol, or for one of a symbol's dates."""
+    try:
+        body = json.loads(data)
+    except ValueError:
+        return False
+
+    def has_error(value, depth):
+        if not isinstance(value, dict):
+            return False
+        return 'error' in value or (depth > 0 and any(has_error(item, depth - 1) for item in value.values()))
+    return has_error(body, 2)
+
+class ResponseCache:
+    """LRU cache of finished responses under a byte budget, with in-flight request coalescing."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires_at'] <= time.time():
+            self._evict(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _evict(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry['size']
+
+    def _put(self, key, entry):
+        if entry['size'] > self.max_bytes:
+            return
+        if key in self.entries:
+            self._evict(key)
+        self.entries[key] = entry
+        self.size += entry['size']
+        while self.size > self.max_bytes:
+            self._evict(next(iter(self.entries)))
+
+    def get_or_compute(self, key, compute, expires_at):
+        """Return the cached entry for key, or compute it once even if many callers ask at the same time.
+
+        compute() returns (entry, cacheable); expires_at(entry) is called when
+        a cacheable entry is stored.
+        """
+        with self.lock:
+            entry = self._get(key)
+            if entry is not None:
+                inc('response_cache_lookups_total', result='hit')
+                return entry
+            event = self.in_flight.get(key)
+            leader = event is None
+            if leader:
+                event = self.in_flight[key] = threading.Event()
+
+        if not leader:
+            event.wait(COALESCE_TIMEOUT_SECONDS)
+            with self.lock:
+                entry = self._get(key)
+            if entry is not None:
+                inc('response_cache_lookups_total', result='coalesced')
+                return entry
+            inc('response_cache_lookups_total', result='miss')
+            return compute()[0]
+
+        inc('response_cache_lookups_total', result='miss')
+        try:
+            entry, cacheable = compute()
+            if cacheable:
+                entry['expires_at'] = expires_at(entry)
+                with self.lock:
+                    self._put(key, entry)
+            return entry
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            event.set()
+
+_cache = ResponseCache()
+
+def cached_route(historical=False):
+    """Cache a POST route's successful JSON answers, keyed on its path and normalized body.
+
+    historical=True marks routes whose answers only use completed sessions.
+    It can also be a function of the JSON body, for routes where that
+    depends on the request. Answers that carry an error entry (a symbol
+    that failed to fetch) are kept for ERROR_TTL_SECONDS only.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            body = request.get_json(silent=True)
+            key = request.path + '\n' + json.dumps(body, sort_keys=True, separators=(',', ':'))
+
+            def compute():
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    # Errors and streams go back to this caller only
+                    return {'response': response}, False
+                data = response.get_data()
+                return {'data': data, 'mimetype': response.mimetype, 'size': len(data) + len(key), 'partial': carries_error(data)}, True
+
+            def expires_at(entry):
+                if entry['partial']:
+                    return time.time() + ERROR_TTL_SECONDS
+                return session_expiry(historical(body) if callable(historical) else historical)
+
+            entry = _cache.get_or_compute(key, compute, expires_at)
+            if 'response' in entry:
+                return entry['response']
+            return Response(entry['data'], mimetype=entry['mimetype'])
+        return wrapper
+    return decorator
@@ -0,0 +1,242 @@
+import bisect
+import heapq
+import math
+from sortedcontainers import SortedList
+
+class ReversalTracker:
+    """Reversal levels kept up to date one bar at a time, for walk-forward use.
+
+    A swing low is confirmed when the bar after it arrives (the same strict
+    rule as find_local_minima), so nothing depends on bars that haven't
+    happened yet. The levels always equal find_reversal_points over the bars
+    fed so far: distinct lows are consolidated in the same order (most
+    reversals first, then first found), each joining the first level created
+    within tolerance_percentage of it.
+
+    A low not seen before has one reversal and was found last, so it only
+    has to join a level: sorted indexes find the levels near it and keep the
+    ranking for levels() current in O(log k) for k levels. A repeated low
+    isn't that cheap. It moves up the consolidation order and joins again at
+    its new place, which refolds the weighted prices of the level it left
+    and the one it joined (time in their number of distinct lows). The lows
+    that a moved price crossed into or out of tolerance of then choose
+    again, in consolidation order, until nothing else moves. Prices rounded
+    to a tick repeat often, so they cost several times more per bar; the
+    benchmark's reversal_tracker_ticks case measures that. For one answer
+    over a whole series, find_reversal_points is faster; the tracker pays
+    off when levels are needed after every bar.
+    """
+
+    def __init__(self, tolerance_percentage):
+        self.tolerance = tolerance_percentage / 100
+        self.previous_lows = []
+        self.bars = 0
+        self.counts = {}   # distinct low -> reversals at it
+        self.found = {}    # distinct low -> order it was first found in
+        self.keys = SortedList()      # (-count, found) of every distinct low: the consolidation order
+        self.lows = SortedList()      # every distinct low
+        self.assigned = {}  # distinct low -> the level it joined
+        # A level is named by the low that started it. Its members are
+        # (key, low) in consolidation order and states its (price, count)
+        # after each of them joined
+        self.members = {}
+        self.states = {}
+        self.entries = {}  # level -> its entries in the indexes below, and its highest price
+        self.ranked = SortedList()    # (-count, key of its first member, level), the order levels() returns
+        self.by_price = SortedList()  # (price, level)
+        self.by_low = SortedList()    # (lowest price it has had, level)
+        self.widths = SortedList()    # (range of prices it has had, level), for how far by_low must look
+        self.queue = []
+        self.queued = set()
+
+    def add(self, low):
+        """Feed the next bar's low; returns the swing low it confirms, or None."""
+        low = float(low)
+        self.bars += 1
+        confirmed = None
+        if len(self.previous_lows) == 2:
+            before, middle = self.previous_lows
+            if middle < before and middle < low:
+                confirmed = middle
+                self._add_reversal(middle)
+        self.previous_lows = (self.previous_lows + [low])[-2:]
+        return confirmed
+
+    def extend(self, lows):
+        """Feed many lows in order; returns the swing lows they confirmed."""
+        return [low for low in map(self.add, lows) if low is not None]
+
+    def _key(self, low):
+        return (-self.counts[low], self.found[low])
+
+    def _add_reversal(self, low):
+        if low in self.counts:
+            self._leave(low)
+            self.keys.remove(self._key(low))
+        else:
+            self.found[low] = len(self.found)
+            self.counts[low] = 0
+            self.lows.add(low)
+        self.counts[low] += 1
+        self.keys.add(self._key(low))
+        self._push(low)
+        while self.queue:
+            key, low = heapq.heappop(self.queue)
+            self.queued.discard(low)
+            level = self._choose(low, key)
+            if self.assigned.get(low) != level:
+                if low in self.assigned:
+                    self._leave(low)
+                self._join(low, level)
+
+    def _push(self, low):
+        if low not in self.queued:
+            self.queued.add(low)
+            heapq.heappush(self.queue, (self._key(low), low))
+
+    def _margin(self, price):
+        # Widened a little so rounding can't hide a level the exact test accepts
+        return abs(self.tolerance * price) * (1 + 1e-9) + 1e-12
+
+    def _choose(self, low, key):
+        """The level low joins when it is consolidated: the first one started
+        within tolerance of its price at that point, else a new one."""
+        band = self.tolerance * low
+        margin = self._margin(low)
+        if key == self.keys[-1]:
+            # Consolidated last, so every level is as it is now
+            near = self.by_price.irange((low - margin,), (low + margin, math.inf))
+        else:
+            widest = self.widths[-1][0] if self.widths else 0.0
+            near = self.by_low.irange((low - margin - widest,), (low + margin, math.inf))
+        chosen = low
+        first = None
+        for _, level in near:
+            members = self.members[level]
+            i = bisect.bisect_left(members, (key,))
+            if i == 0 or abs(self.states[level][i - 1][0] - low) > band:
+                continue
+            if first is None or members[0][0] < first:
+                chosen, first = level, members[0][0]
+        return chosen
+
+    def _join(self, low, level):
+        self.assigned[low] = level
+        key = self._key(low)
+        members = self.members.setdefault(level, [])
+        self.states.setdefault(level, [])
+        i = bisect.bisect_left(members, (key, low))
+        members.insert(i, (key, low))
+        self._refold(level, i, key, True)
+
+    def _leave(self, low):
+        level = self.assigned.pop(low)
+        key = self._key(low)
+        i = bisect.bisect_left(self.members[level], (key, low))
+        del self.members[level][i]
+        self._refold(level, i, key, False)
+
+    def _refold(self, level, i, key, joined):
+        """Recompute level's prices from member i on after a low at key joined or left."""
+        members, states = self.members[level], self.states[level]
+        old = [price for price, _ in states[i:]]
+        appended = not old and i > 0
+        del states[i:]
+        for _, low in members[i:]:
+            count = self.counts[low]
+            if states:
+                price, level_count = states[-1]
+                states.append(((price * level_count + low * count) / (level_count + count), level_count + count))
+            else:
+                states.append((low, count))
+
+        if appended:
+            lowest, highest = self.entries[level][2][0], self.entries[level][4]
+        if level in self.entries:
+            ranked, by_price, by_low, width, _ = self.entries.pop(level)
+            self.ranked.remove(ranked)
+            self.by_price.remove(by_price)
+            self.by_low.remove(by_low)
+            self.widths.remove(width)
+        if members:
+            price, count = states[-1]
+            if appended:
+                lowest, highest = min(lowest, price), max(highest, price)
+            else:
+                prices = [price for price, _ in states]
+                lowest, highest = min(prices), max(prices)
+            self.entries[level] = ((-count, members[0][0], level), (price, level), (lowest, level), (highest - lowest, level), highest)
+            self.ranked.add(self.entries[level][0])
+            self.by_price.add(self.entries[level][1])
+            self.by_low.add(self.entries[level][2])
+            self.widths.add(self.entries[level][3])
+        else:
+            del self.members[level], self.states[level]
+
+        # A low consolidated after this change sees the level as it was after
+        # the last member before it. Its choice can only change if the level's
+        # first member changed or that price crossed an edge of its band
+        if not self.keys or self.keys[-1] <= key:
+            return
+        new = [price for price, _ in states[i:]]
+        counts, found = self.counts, self.found
+        if i == 0 or self.tolerance >= 1:
+            # The level started or stopped existing for some of them
+            for low in self._near(old + new):
+                if (-counts[low], found[low]) > key:
+                    self._push(low)
+            return
+
+        # seen[q - start] is the (old, new) price for lows whose last member
+        # before them is now member q
+        before = [states[i - 1][0]]
+        seen = list(zip(before + old, new)) if joined else list(zip(old, before + new))
+        start = i if joined else i - 1
+        prices = before + old + new
+        for edge in (1 + self.tolerance, 1 - self.tolerance):
+            lower, upper = min(prices) / edge, max(prices) / edge
+            for low in self.lows.irange(lower - abs(lower) * 1e-9 - 1e-12, upper + abs(upper) * 1e-9 + 1e-12):
+                low_key = (-counts[low], found[low])
+                if low_key <= key:
+                    continue
+                q = bisect.bisect_left(members, (low_key,)) - 1 - start
+                if q < 0:
+                    continue
+                a, b = seen[q]
+                band = self.tolerance * low
+                if (abs(a - low) <= band) != (abs(b - low) <= band):
+                    self._push(low)
+
+    def _near(self, prices):
+        """Distinct lows within tolerance of any of prices."""
+        if self.tolerance >= 1:
+            return self.lows
+        lower = min(min(prices) / (1 + self.tolerance), min(prices) / (1 - self.tolerance))
+        upper = max(max(prices) / (1 - self.tolerance), max(prices) / (1 + self.tolerance))
+        return self.lows.irange(lower - self._margin(lower), upper + self._margin(upper))
+
+    def levels(self, num=None):
+        """(price, count) levels, most reversals first, like find_reversal_points."""
+        return [self.states[level][-1] for _, _, level in self.ranked.islice(0, num)]
+
+    def support_below(self, price, min_count=1):
+        """The highest level at or below price with at least min_count reversals, or None."""
+        for _, level in self.by_price.irange(maximum=(price, math.inf), reverse=True):
+            if self.states[level][-1][1] >= min_count:
+                return self.states[level][-1]
+        return None
+
+    def __len__(self):
+        return len(self.members)
+
+def walk_forward_levels(lows, tolerance_percentage, num=3):
+    """For each bar, the top levels known at its close, without looking ahead."""
+    tracker = ReversalTracker(tolerance_percentage)
+    history = []
+    levels = []
+    for low in lows:
+        # Levels only change when a bar confirms a swing low
+        if tracker.add(low) is not None:
+            levels = tracker.levels(num)
+        history.append(levels)
+    return history
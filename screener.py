@@ -0,0 +1,95 @@
+import os
+import datetime
+import math
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utilities import SMA_LOOKBACK_DAYS, get_stock_data, summarize_trend_volumes, find_reversal_points
+from indicators import latest_indicators
+
+UNIVERSE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stocksList.txt')
+CHECKS = ('volume', 'sma', 'reversal')
+
+def load_universe(path=UNIVERSE_PATH, suffix='.NS'):
+    """Read the symbol universe, one NSE symbol per line."""
+    with open(path) as f:
+        return [line.strip() + suffix for line in f if line.strip()]
+
+def _round(value):
+    if value is None:
+        return None
+    value = float(value)
+    return round(value, 2) if math.isfinite(value) else None
+
+def screen_symbol(symbol, start_date, end_date, checks=CHECKS, tolerance_percentage=3.0, num_reversals=3, proximity_percentage=2.0):
+    """Run the volume-trend, SMA and reversal-proximity checks on one symbol.
+
+    The symbol matches when every requested check passes: up-day volume above
+    down-day volume, close above the 20/50/200 SMAs, and close within
+    proximity_percentage of one of the strongest reversal levels.
+    """
+    data = get_stock_data(symbol, start_date, end_date)
+    if data.empty:
+        return {'symbol': symbol.replace(".NS", ""), 'error': f"No data fetched for {symbol}."}
+
+    volume_analysis = summarize_trend_volumes(symbol, data)
+    reversal_levels = find_reversal_points(data, tolerance_percentage)[:num_reversals]
+    sma_values = latest_indicators(symbol, data)
+    close = sma_values['Close']
+
+    nearest_level, distance_percentage = None, None
+    for price, count in reversal_levels:
+        distance = (close - price) / price * 100
+        if distance_percentage is None or abs(distance) < abs(distance_percentage):
+            nearest_level, distance_percentage = price, distance
+
+    passed = {
+        'volume': bool(volume_analysis['higher_volume_uptrend']),
+        'sma': bool(close > sma_values['20SMA'] and close > sma_values['50SMA'] and close > sma_values['200SMA']),
+        'reversal': distance_percentage is not None and abs(distance_percentage) <= proximity_percentage
+    }
+    return {
+        'symbol': symbol.replace(".NS", ""),
+        'match': all(passed[check] for check in checks),
+        'checks': {check: passed[check] for check in checks},
+        'close': _round(close),
+        '20SMA': _round(sma_values['20SMA']),
+        '50SMA': _round(sma_values['50SMA']),
+        '200SMA': _round(sma_values['200SMA']),
+        'percentage_higher': _round(volume_analysis['percentage_higher']),
+        'nearest_reversal': _round(nearest_level),
+        'reversal_distance_percentage': _round(distance_percentage)
+    }
+
+def screen(symbols, start_date=None, end_date=None, max_workers=8, **kwargs):
+    """Screen symbols concurrently and yield each result as soon as it is ready.
+
+    At most 2 * max_workers symbols are in flight at once, so memory stays
+    bounded no matter how large the universe is.
+    """
+    if start_date is None:
+        # Enough history for a full 200-session SMA
+        start_date = datetime.date.today() - datetime.timedelta(days=SMA_LOOKBACK_DAYS)
+    if end_date is None:
+        end_date = datetime.date.today() + datetime.timedelta(days=1)
+
+    symbols = iter(symbols)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def submit_next():
+            for symbol in symbols:
+                pending[executor.submit(screen_symbol, symbol, start_date, end_date, **kwargs)] = symbol
+                return True
+            return False
+
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                symbol = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {'symbol': symbol.replace(".NS", ""), 'error': str(e)}
+                submit_next()
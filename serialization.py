@@ -0,0 +1,45 @@
+import json
+import math
+from flask import Response, current_app, jsonify, stream_with_context
+from instrumentation import stage
+
+def number_formatter(numeric=False):
+    """Return fmt(value, digits=2) for the numbers in a response.
+
+    By default values become "{:.2f}" strings, as the routes have always
+    returned them. numeric=True rounds them and leaves them as JSON numbers
+    instead of building a string per value; NaN and infinities, which JSON
+    can't hold, become null.
+    """
+    if numeric:
+        def fmt(value, digits=2):
+            if value is None or not math.isfinite(value):
+                return None
+            return round(float(value), digits)
+    else:
+        def fmt(value, digits=2):
+            return None if value is None else "{:.{}f}".format(value, digits)
+    return fmt
+
+def symbol_response(rows, stream=False):
+    """Build the response for a multi-symbol route from its (key, payload) rows.
+
+    With stream=True each row is sent as one NDJSON line, {"symbol": key, ...},
+    as soon as it is computed, so the whole answer is never held in memory.
+    Otherwise the rows are collected into one {key: payload} object.
+    """
+    if stream:
+        def generate():
+            try:
+                for key, payload in rows:
+                    yield current_app.json.dumps({'symbol': key, **payload}) + '\n'
+            except Exception as e:
+                # Headers are already sent, so report the failure as a last line
+                yield json.dumps({'error': str(e)}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    stock_data = dict(rows)
+    with stage('serialize'):
+        body = jsonify(stock_data)
+    return body
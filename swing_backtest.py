@@ -0,0 +1,72 @@
+import numpy as np
+
+def swing_trade(close, high, low, stop_loss_percent, target_percent):
+    """Run the swing rules over one symbol's bars.
+
+    The position is entered at the first close. Each time a high reaches the
+    target, the stop ratchets up (to the entry price the first time, then to
+    the target that was just hit) and the target moves up another
+    target_percent. The trade closes when a low reaches the stop.
+    Returns a dict of bar indices and prices, or None if there are fewer than
+    two bars.
+    """
+    close = np.ascontiguousarray(close, dtype=float)
+    high = np.ascontiguousarray(high, dtype=float)
+    low = np.ascontiguousarray(low, dtype=float)
+    n = close.shape[0]
+    if n < 2:
+        return None
+
+    entry_price = close[0]
+    stop_loss_price = entry_price * (1 - stop_loss_percent / 100)
+    target_price = entry_price * (1 + target_percent / 100)
+    trailed = False
+
+    # Exits are only checked from the third bar on, as the original loop did
+    i = 2
+    while i < n:
+        events = (low[i:] <= stop_loss_price) | (high[i:] >= target_price)
+        if not events.any():
+            break
+        i += int(events.argmax())
+        if low[i] <= stop_loss_price:
+            return {
+                'entry_index': 0,
+                'entry_price': entry_price,
+                'exit_index': i,
+                'exit_price': stop_loss_price,
+                'result': 'Hit',
+                'profit': stop_loss_price - entry_price,
+                'stop_loss': stop_loss_price,
+                'target': target_price,
+                'latest_price': close[-1]
+            }
+        stop_loss_price = target_price if trailed else entry_price
+        trailed = True
+        target_price = target_price * (1 + target_percent / 100)
+        i += 1
+
+    return {
+        'entry_index': 0,
+        'entry_price': entry_price,
+        'exit_index': None,
+        'exit_price': None,
+        'result': 'Open',
+        'profit': close[-1] - entry_price,
+        'stop_loss': stop_loss_price,
+        'target': target_price,
+        'latest_price': close[-1]
+    }
+
+def swing_backtest(frames, stop_loss_percent, target_percent):
+    """Run swing_trade over many (symbol, frame) pairs and return {symbol: trade}."""
+    trades = {}
+    for symbol, data in frames:
+        trades[symbol] = swing_trade(
+            data['Close'].to_numpy(dtype=float),
+            data['High'].to_numpy(dtype=float),
+            data['Low'].to_numpy(dtype=float),
+            stop_loss_percent,
+            target_percent,
+        )
+    return trades
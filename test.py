@@ -1,8 +1,8 @@
-import yfinance as yf
+from providers import get_provider
 
 def analyze_stock_data(ticker_symbol, start_date="2021-01-01", end_date="2024-05-31"):
     # Fetch historical data
-    historical_data = yf.download(ticker_symbol, start=start_date, end=end_date, interval="1d")
+    historical_data = get_provider().download(ticker_symbol, start=start_date, end=end_date, interval="1d")
     
     # Check if data is fetched successfully
     if historical_data.empty:
@@ -0,0 +1,120 @@
+import datetime
+import os
+import threading
+import numpy as np
+import pandas as pd
+from bar_store import load_bars, stored_bars
+from response_cache import market_today
+
+# Sessions are the days the NIFTY 50 index printed a bar
+INDEX_SYMBOL = '^NSEI'
+HISTORY_START = '2000-01-01'
+# Calendar days of index bars fetched for the everyday calendar; older
+# sessions come from whatever the bar store already holds
+RECENT_DAYS = 60
+# Days past the last index bar are assumed to be weekday sessions, except these
+# announced holidays (comma-separated YYYY-MM-DD)
+ANNOUNCED_HOLIDAYS = [day.strip() for day in os.environ.get('NSE_HOLIDAYS', '').split(',') if day.strip()]
+FUTURE_DAYS = 730
+# Needed sessions at most this many sessions apart share one download window;
+# a few extra bars cost less than another request
+MAX_GAP_SESSIONS = 30
+
+class TradingCalendar:
+    """NSE sessions as one sorted index, with searchsorted session-offset lookups.
+
+    Days before the first known session and after the last one count as
+    weekday sessions, except announced holidays.
+    """
+
+    def __init__(self, sessions, announced_holidays=()):
+        known = pd.DatetimeIndex(sessions).normalize().unique().sort_values()
+        self.last_known = known[-1] if len(known) else pd.Timestamp(HISTORY_START) - pd.Timedelta(days=1)
+        self.first_known = known[0] if len(known) else self.last_known + pd.Timedelta(days=1)
+        past = pd.bdate_range(HISTORY_START, self.first_known - pd.Timedelta(days=1))
+        future = pd.bdate_range(self.last_known + pd.Timedelta(days=1), pd.Timestamp(market_today()) + pd.Timedelta(days=FUTURE_DAYS))
+        future = future.difference(pd.DatetimeIndex(pd.to_datetime(list(announced_holidays))))
+        self.sessions = past.append(known).append(future)
+        self._values = self.sessions.values
+
+    def holidays(self):
+        """Weekdays without a session, between the first and last known sessions."""
+        weekdays = pd.bdate_range(self.first_known, self.last_known)
+        return weekdays.difference(self.sessions)
+
+    def is_session(self, day):
+        day = np.datetime64(pd.Timestamp(day).normalize().to_datetime64())
+        i = np.searchsorted(self._values, day)
+        return bool(i < len(self._values) and self._values[i] == day)
+
+    def sessions_after(self, dates, offsets):
+        """The session offsets[j] sessions after the first session on or after dates[i].
+
+        Returns a (len(dates), len(offsets)) datetime64 array; offset 0 is the
+        date itself, or the next session if the date is a holiday. Lookups past
+        the calendar are NaT.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(dates)).normalize().values
+        positions = np.searchsorted(self._values, dates)[:, None] + np.asarray(offsets, dtype=np.int64)[None, :]
+        inside = positions < len(self._values)
+        result = np.full(positions.shape, np.datetime64('NaT'), dtype=self._values.dtype)
+        result[inside] = self._values[positions[inside]]
+        return result
+
+    def fetch_windows(self, sessions, max_gap=MAX_GAP_SESSIONS):
+        """Group the sessions a request needs into [start, end) download windows.
+
+        Windows start and end on needed sessions, and a new window starts only
+        where more than max_gap sessions separate two needed ones. Sessions that
+        haven't happened yet need no bars.
+        """
+        tomorrow = pd.Timestamp(market_today()) + pd.Timedelta(days=1)
+        needed = np.unique(np.asarray(sessions).ravel())
+        needed = needed[~np.isnat(needed)]
+        needed = needed[needed < tomorrow.to_datetime64()]
+        windows = []
+        positions = np.searchsorted(self._values, needed)
+        for position, session in zip(positions.tolist(), needed):
+            if windows and position - windows[-1][2] <= max_gap:
+                windows[-1][1], windows[-1][2] = session, position
+            else:
+                windows.append([session, session, position])
+        return [(pd.Timestamp(start).date(), (pd.Timestamp(end) + pd.Timedelta(days=1)).date()) for start, end, _ in windows]
+
+# (calendar, day built) for the everyday and the full-history calendar
+_calendars = {}
+_locks = {False: threading.Lock(), True: threading.Lock()}
+
+def _build_calendar(full_history, today):
+    """Build from the index's bars, or return None if they couldn't be fetched."""
+    start = HISTORY_START if full_history else today - datetime.timedelta(days=RECENT_DAYS)
+    try:
+        recent = load_bars(INDEX_SYMBOL, start, today + datetime.timedelta(days=1))
+    except OSError:
+        return None
+    if recent.empty:
+        # yfinance returns an empty frame when the request fails
+        return None
+    return TradingCalendar(stored_bars(INDEX_SYMBOL).index.append(recent.index), ANNOUNCED_HOLIDAYS)
+
+def get_calendar(full_history=False):
+    """The process-wide calendar, rebuilt once a day from the index's bars.
+
+    By default only the last RECENT_DAYS of index bars are fetched, which is
+    all that session checks need; older sessions come from the bar store if
+    it already has them. full_history=True fetches back to HISTORY_START, for
+    session offsets from arbitrary past dates. If the index can't be fetched,
+    every weekday counts as a session for this call, and the next call tries
+    again.
+    """
+    today = market_today()
+    with _locks[full_history]:
+        for built_full in (full_history, True):
+            calendar, day = _calendars.get(built_full, (None, None))
+            if calendar is not None and day == today:
+                return calendar
+        calendar = _build_calendar(full_history, today)
+        if calendar is None:
+            return TradingCalendar([], ANNOUNCED_HOLIDAYS)
+        _calendars[full_history] = calendar, today
+    return calendar
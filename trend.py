@@ -1,9 +1,6 @@
 import numpy as np
-import yfinance as yf
+from providers import get_provider
 
-import plotly.graph_objects as go
-import plotly.io as pio
-pio.renderers.default='svg'
 TICKER = 'IRFC.NS'
 BEST_FIT_LENGTH = 25
 PLOT_LENGTH = 75
@@ -31,10 +28,123 @@ def best_fit(y: np.array):
     c = y_bar - m*x_bar
     
     return m, c
+
+def rolling_best_fit(y, window):
+    '''
+    Fit best_fit to every rolling window of a series, or of each column of a
+    2-D (time x tickers) panel, from cumulative sums instead of refitting.
+    Parameters
+    ----------
+    y : np.array
+        Shape (n,) or (n, k). Windows that contain a NaN give NaN
+    window : int
+        Number of bars per window
+    Returns
+    -------
+    [m, c, r2] : np.arrays
+        Shaped like y and aligned to each window's last bar; the first
+        window - 1 rows are NaN. As in best_fit, x runs from 0 at the
+        window's first bar, so the line ends at c + m*(window - 1)
+    '''
+    y = np.asarray(y, dtype=float)
+    one_dimensional = y.ndim == 1
+    if one_dimensional:
+        y = y[:, None]
+    n = y.shape[0]
+    m = np.full(y.shape, np.nan)
+    c = np.full(y.shape, np.nan)
+    r2 = np.full(y.shape, np.nan)
+
+    if window >= 2 and n >= window:
+        missing = np.isnan(y)
+        # Centring each column keeps the cumulative sums small enough to subtract accurately
+        offset = np.array([column[~gap].mean() if (~gap).any() else 0.0 for column, gap in zip(y.T, missing.T)])
+        y = np.where(missing, 0.0, y - offset)
+
+        # Prefix sums restart every `window` rows and j counts from each
+        # block's first row, so no sum grows with the length of the series
+        # and differences of them don't cancel. A window starting j rows into
+        # a block covers its tail and, when j > 0, the next block's head
+        blocks = -(-n // window)
+        count = n - window + 1
+        j = (np.arange(n) % window)[:, None].astype(float)
+        offset_in_block = j[:count]
+
+        def window_parts(values):
+            padded = np.zeros((blocks * window, values.shape[1]))
+            padded[:n] = values
+            local = np.cumsum(padded.reshape(blocks, window, -1), axis=1)
+            block_totals = np.repeat(local[:, -1], window, axis=0)[:count]
+            local = local.reshape(blocks * window, -1)
+            tail = block_totals - local[:count] + values[:count]
+            head = local[window - 1:n].copy()
+            head[offset_in_block[:, 0] == 0] = 0.0
+            return tail, head
+
+        y_tail, y_head = window_parts(y)
+        jy_tail, jy_head = window_parts(j * y)
+        yy_tail, yy_head = window_parts(y * y)
+        s_y = y_tail + y_head
+        missing_counts = np.cumsum(np.vstack([np.zeros((1, y.shape[1])), missing]), axis=0)
+        gaps = missing_counts[window:] - missing_counts[:-window] > 0
+
+        x_bar = (window - 1) / 2
+        s_xx = window * (window ** 2 - 1) / 12
+        y_bar = s_y / window
+        # Covariances about each window's own mean. The window-local x is
+        # j - offset in the first block and j + window - offset in the next
+        s_xy = (jy_tail - offset_in_block * y_tail) + (jy_head + (window - offset_in_block) * y_head) - x_bar * s_y
+        s_yy = yy_tail + yy_head - s_y * y_bar
+
+        slope = s_xy / s_xx
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fit = np.where(s_yy > 0, s_xy ** 2 / (s_xx * s_yy), np.nan)
+        m[window - 1:] = np.where(gaps, np.nan, slope)
+        c[window - 1:] = np.where(gaps, np.nan, y_bar - slope * x_bar + offset)
+        r2[window - 1:] = np.where(gaps, np.nan, np.minimum(fit, 1.0))
+
+    if one_dimensional:
+        return m[:, 0], c[:, 0], r2[:, 0]
+    return m, c, r2
+
+def latest_trend_lines(frames, lookbacks=(BEST_FIT_LENGTH,)):
+    '''
+    Resistance (High) and support (Low) lines over the last N bars of every
+    ticker, for each N in lookbacks
+    Parameters
+    ----------
+    frames : dict
+        {ticker: OHLC DataFrame}
+    lookbacks : iterable of int
+    Returns
+    -------
+    {ticker: {N: {'resistance': (m, c, r2), 'support': (m, c, r2)}}}
+        Tickers with fewer than N bars get NaNs for that N
+    '''
+    tickers = list(frames)
+    length = max((len(frames[ticker]) for ticker in tickers), default=0)
+    result = {ticker: {} for ticker in tickers}
+    for name, column in (('resistance', 'High'), ('support', 'Low')):
+        # Right-align the tickers so the last row holds every ticker's latest bar
+        panel = np.full((length, len(tickers)), np.nan)
+        for k, ticker in enumerate(tickers):
+            values = frames[ticker][column].to_numpy(dtype=float)
+            if len(values):
+                panel[length - len(values):, k] = values
+        for lookback in lookbacks:
+            m, c, r2 = rolling_best_fit(panel, lookback)
+            for k, ticker in enumerate(tickers):
+                latest = (m[-1, k], c[-1, k], r2[-1, k]) if length else (np.nan,) * 3
+                result[ticker].setdefault(lookback, {})[name] = latest
+    return result
     
 if __name__ == '__main__':
+    # Plotting dependencies are only needed for the chart, not for best_fit
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    pio.renderers.default='svg'
     
-    df = yf.download(TICKER).reset_index()
+    df = get_provider().download(TICKER).reset_index()
     
     m_high, c_high = best_fit(df['High'].values[-BEST_FIT_LENGTH:])
     m_low, c_low = best_fit(df['Low'].values[-BEST_FIT_LENGTH:])
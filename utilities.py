@@ -1,14 +1,12 @@
-import yfinance as yf
+import bisect
+import math
 import pandas as pd
 import numpy as np
-
-def classify_trend(row):
-    if row['Close'] > row['Open']:
-        return 'uptrend'
-    elif row['Close'] < row['Open']:
-        return 'downtrend'
-    else:
-        return 'no_trend'
+from bar_store import load_bars
+from providers import OHLCV_COLUMNS, get_provider
+from instrumentation import inc, stage
+from indicators import latest_indicators
+from trading_calendar import get_calendar
 
 def analyze_trend_volumes(ticker, start_date, end_date):
     data = get_stock_data(ticker, start_date, end_date)
@@ -17,79 +15,265 @@ def analyze_trend_volumes(ticker, start_date, end_date):
         print(f"No data fetched for {ticker}.")
         return None
     
-    data['Trend'] = data.apply(classify_trend, axis=1)
-    
-    uptrend_days = data[data['Trend'] == 'uptrend']
-    downtrend_days = data[data['Trend'] == 'downtrend']
-    
-    avg_volume_uptrend = uptrend_days['Volume'].mean()
-    avg_volume_downtrend = downtrend_days['Volume'].mean()
-    
-    if avg_volume_downtrend > 0:
-        percentage_higher = ((avg_volume_uptrend - avg_volume_downtrend) / avg_volume_downtrend) * 100
-    else:
-        percentage_higher = np.inf
-    
+    return summarize_trend_volumes(ticker, data)
+
+def _trend_volume_sums(group_codes, num_groups, open_prices, close_prices, volumes):
+    """Total volume and bar count per group for down, flat and up bars, in one bincount pass.
+
+    Bars are up when Close > Open and down when Close < Open; anything else
+    (including missing prices) counts as no trend. Missing volumes are skipped.
+    Returns two (num_groups, 3) arrays with columns down, flat, up.
+    """
+    direction = np.sign(np.nan_to_num(close_prices - open_prices)).astype(np.int64)
+    valid = ~np.isnan(volumes)
+    keys = group_codes[valid] * 3 + direction[valid] + 1
+    sums = np.bincount(keys, weights=volumes[valid], minlength=num_groups * 3).reshape(num_groups, 3)
+    counts = np.bincount(keys, minlength=num_groups * 3).reshape(num_groups, 3)
+    return sums, counts
+
+def _trend_volume_means(group_codes, num_groups, open_prices, close_prices, volumes):
+    """Average volume on up days and down days for each group."""
+    sums, counts = _trend_volume_sums(group_codes, num_groups, open_prices, close_prices, volumes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return means[:, 2], means[:, 0]
+
+def _percentage_higher(avg_volume_uptrend, avg_volume_downtrend):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(avg_volume_downtrend > 0, (avg_volume_uptrend - avg_volume_downtrend) / avg_volume_downtrend * 100, np.inf)
+
+def summarize_trend_volumes(ticker, data):
+    """Compare average volume on up days and down days for already fetched data."""
+    up, down = _trend_volume_means(
+        np.zeros(len(data), dtype=np.int64),
+        1,
+        data['Open'].to_numpy(dtype=float),
+        data['Close'].to_numpy(dtype=float),
+        data['Volume'].to_numpy(dtype=float)
+    )
+    return trend_volume_summary(ticker, up[0], down[0])
+
+def trend_volume_summary(ticker, avg_volume_uptrend, avg_volume_downtrend):
     return {
         'ticker': ticker,
         'avg_volume_uptrend': avg_volume_uptrend,
         'avg_volume_downtrend': avg_volume_downtrend,
-        'uptrend_volumes': uptrend_days['Volume'].tolist(),
-        'downtrend_volumes': downtrend_days['Volume'].tolist(),
         'higher_volume_uptrend': avg_volume_uptrend > avg_volume_downtrend,
-        'percentage_higher': percentage_higher
+        'percentage_higher': _percentage_higher(avg_volume_uptrend, avg_volume_downtrend)[()]
     }
 
+def stack_frames(frames):
+    """Stack (ticker, frame) pairs into one panel indexed by (Ticker, Date)."""
+    return pd.concat(dict(frames), names=['Ticker', 'Date'])
+
+def summarize_trend_volumes_panel(panel):
+    """summarize_trend_volumes for every ticker of a stacked (Ticker, Date) panel.
+
+    Returns a DataFrame indexed by ticker.
+    """
+    codes, tickers = pd.factorize(panel.index.get_level_values(0))
+    up, down = _trend_volume_means(
+        codes.astype(np.int64),
+        len(tickers),
+        panel['Open'].to_numpy(dtype=float),
+        panel['Close'].to_numpy(dtype=float),
+        panel['Volume'].to_numpy(dtype=float)
+    )
+    return pd.DataFrame({
+        'avg_volume_uptrend': up,
+        'avg_volume_downtrend': down,
+        'higher_volume_uptrend': up > down,
+        'percentage_higher': _percentage_higher(up, down)
+    }, index=pd.Index(tickers, name='Ticker'))
+
 def find_stocks_with_volume_trend(ticker, start_date, end_date):
     analysis = analyze_trend_volumes(ticker, start_date, end_date)
     if analysis:
         return analysis
     return
 
-def get_stock_data(ticker, start_date, end_date):
-    """Fetch historical data from Yahoo Finance."""
-    data = yf.download(ticker, start=start_date, end=end_date, interval="1d")
-    return data
+def get_stock_data(ticker, start_date, end_date, interval="1d"):
+    """Fetch historical data, served from the local bar store and topped up from Yahoo Finance."""
+    return load_bars(ticker, start_date, end_date, interval=interval)
+
+def _chunks(symbols, chunk_size, first_chunk_size):
+    """Split symbols into chunks that start at first_chunk_size and double up to chunk_size."""
+    i, size = 0, min(first_chunk_size, chunk_size)
+    while i < len(symbols):
+        yield symbols[i:i + size]
+        i += size
+        size = min(size * 2, chunk_size)
+
+def iter_stock_chunks(symbols, chunk_size=100, first_chunk_size=5, **kwargs):
+    """Download many symbols with one grouped request per chunk and yield (chunk, {symbol: frame}).
+
+    Keyword arguments (start, end, period, interval, auto_adjust) are passed to
+    the provider's download_many. Prices are adjusted by default to match what
+    Ticker.history returns. Only one chunk of frames is held at a time. The
+    first chunk is small, so a streamed response starts quickly, and the
+    chunks double from there up to chunk_size.
+
+    If a grouped request fails, its symbols are downloaded one by one, and a
+    symbol that still fails comes back as an empty frame.
+    """
+    provider = get_provider()
+    for chunk in _chunks(list(dict.fromkeys(symbols)), chunk_size, first_chunk_size):
+        with stage('fetch'):
+            try:
+                frames = provider.download_many(chunk, **kwargs)
+            except Exception:
+                inc('grouped_download_failures_total')
+                frames = {}
+                for symbol in chunk:
+                    try:
+                        frames.update(provider.download_many([symbol], **kwargs))
+                    except Exception:
+                        frames[symbol] = pd.DataFrame(columns=OHLCV_COLUMNS)
+        yield chunk, frames
+
+def iter_stock_frames(symbols, chunk_size=100, first_chunk_size=5, **kwargs):
+    """Like iter_stock_chunks, but yield (symbol, frame) pairs."""
+    for _, frames in iter_stock_chunks(symbols, chunk_size, first_chunk_size, **kwargs):
+        yield from frames.items()
+
+def iter_session_closes(symbols, dates, offsets, chunk_size=100, first_chunk_size=5):
+    """Closes offsets[j] sessions after each of dates[i], downloading only the sessions needed.
+
+    Yields (chunk, sessions, closes) per chunk of symbols. sessions is the
+    (dates x offsets) array from TradingCalendar.sessions_after, and closes
+    maps each symbol to a float array of the same shape, NaN where the symbol
+    has no bar for that session (not traded yet, or suspended).
+    """
+    calendar = get_calendar(full_history=True)
+    sessions = calendar.sessions_after(dates, offsets)
+    windows = calendar.fetch_windows(sessions)
+    wanted = pd.DatetimeIndex(sessions.ravel())
+    for chunk in _chunks(list(dict.fromkeys(symbols)), chunk_size, first_chunk_size):
+        closes = {symbol: np.full(sessions.size, np.nan) for symbol in chunk}
+        for start, end in windows:
+            for symbol, data in iter_stock_frames(chunk, len(chunk), len(chunk), start=start, end=end):
+                close = pd.Series(data['Close'].to_numpy(dtype=float), index=data.index.normalize())
+                close = close[~close.index.duplicated(keep='last')]
+                positions = close.index.get_indexer(wanted)
+                found = positions >= 0
+                closes[symbol][found] = close.to_numpy()[positions[found]]
+        yield chunk, sessions, {symbol: values.reshape(sessions.shape) for symbol, values in closes.items()}
+
+def find_local_minima(lows):
+    """Return the lows that are strictly below both of their neighbours."""
+    lows = np.asarray(lows, dtype=float)
+    if lows.shape[0] < 3:
+        return lows[:0]
+    middle = lows[1:-1]
+    return middle[(middle < lows[:-2]) & (middle < lows[2:])]
+
+def count_local_minima(lows):
+    """The distinct local minima of lows and how often each occurs, in the order they were first found."""
+    prices, first, counts = np.unique(find_local_minima(lows), return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return prices[order], counts[order]
+
+def consolidate_reversal_levels(prices, counts, tolerance_percentage):
+    """Merge reversal levels lying within tolerance_percentage of each other.
+
+    prices and counts are the distinct levels in the order they were found.
+    Levels are visited by count, most first, and each joins the first
+    consolidated level whose weighted price is within tolerance of it, or
+    starts a new one. The consolidated prices are kept in a sorted index, so
+    only the levels near each price are looked at.
+    """
+    tolerance = tolerance_percentage / 100
+    prices = np.asarray(prices, dtype=float)
+    counts = np.asarray(counts)
+    order = np.argsort(-counts, kind='stable')
+    consolidated_prices, consolidated_counts = [], []
+    index = []  # (price, position in consolidated_prices), sorted
+    for price, count in zip(prices[order].tolist(), counts[order].tolist()):
+        band = tolerance * price
+        # Widened a little so rounding can't hide a level the exact test accepts
+        margin = abs(band) * (1 + 1e-9) + 1e-12
+        lo = bisect.bisect_left(index, (price - margin,))
+        hi = bisect.bisect_right(index, (price + margin, math.inf))
+        matches = [k for consolidated_price, k in index[lo:hi] if abs(consolidated_price - price) <= band]
+        if matches:
+            k = min(matches)
+            consolidated_price, consolidated_count = consolidated_prices[k], consolidated_counts[k]
+            del index[bisect.bisect_left(index, (consolidated_price, k))]
+            consolidated_prices[k] = (consolidated_price * consolidated_count + price * count) / (consolidated_count + count)
+            consolidated_counts[k] = consolidated_count + count
+        else:
+            k = len(consolidated_prices)
+            consolidated_prices.append(price)
+            consolidated_counts.append(count)
+        bisect.insort(index, (consolidated_prices[k], k))
+
+    return sorted(zip(consolidated_prices, consolidated_counts), key=lambda x: x[1], reverse=True)
 
 def find_reversal_points(data, tolerance_percentage):
     """Find potential reversal points in the historical data."""
-    lows = data['Low']
-    reversals = {}
-
-    for i in range(1, len(lows) - 1):
-        if lows[i] < lows[i - 1] and lows[i] < lows[i + 1]:
-            reversal_point = lows[i]
-            if reversal_point in reversals:
-                reversals[reversal_point] += 1
-            else:
-                reversals[reversal_point] = 1
-
-    # Sort reversals by count
-    sorted_reversals = sorted(reversals.items(), key=lambda x: x[1], reverse=True)
-
-    # Consolidate nearby reversal points based on percentage tolerance
-    consolidated_reversals = []
-    for price, count in sorted_reversals:
-        found = False
-        for idx in range(len(consolidated_reversals)):
-            consolidated_price, consolidated_count = consolidated_reversals[idx]
-            if abs(consolidated_price - price) <= (tolerance_percentage / 100) * price:
-                # Update the consolidated price and count
-                new_price = (consolidated_price * consolidated_count + price * count) / (consolidated_count + count)
-                consolidated_reversals[idx] = (new_price, consolidated_count + count)
-                found = True
-                break
-        if not found:
-            consolidated_reversals.append((price, count))
-
-    return sorted(consolidated_reversals, key=lambda x: x[1], reverse=True)
+    prices, counts = count_local_minima(data['Low'])
+    return consolidate_reversal_levels(prices, counts, tolerance_percentage)
+
+def reversal_range_histogram(levels, range_width=None, range_percentage=None, reference_prices=None, min_count=2):
+    """Count reversals per price range for many tickers at once.
+
+    levels holds one list of (price, count) reversal levels per ticker, as
+    returned by find_reversal_points. Ranges are either range_width wide in
+    price, or range_percentage wide on a log scale around each ticker's
+    reference price (usually its last close) so that differently priced
+    stocks share the same buckets. Levels seen fewer than min_count times
+    are ignored.
+
+    Returns a dict of arrays: 'buckets' (integer range indices that are
+    non-empty for some ticker), 'lower_bounds' (each range's lower price,
+    or its lower edge in percent from the reference price) and 'counts'
+    (tickers x buckets).
+    """
+    if (range_width is None) == (range_percentage is None):
+        raise ValueError("Pass exactly one of range_width and range_percentage")
+    sizes = [len(ticker_levels) for ticker_levels in levels]
+    ticker_index = np.repeat(np.arange(len(levels)), sizes)
+    flat = np.array([level for ticker_levels in levels for level in ticker_levels], dtype=float).reshape(-1, 2)
+    prices, counts = flat[:, 0], flat[:, 1]
+
+    if range_width is not None:
+        keep = counts >= min_count
+        buckets = np.floor(prices[keep] / range_width)
+    else:
+        reference = np.asarray(reference_prices, dtype=float)[ticker_index]
+        keep = (counts >= min_count) & (prices > 0) & (reference > 0)
+        step = np.log1p(range_percentage / 100)
+        buckets = np.floor(np.log(prices[keep] / reference[keep]) / step)
+    ticker_index, counts = ticker_index[keep], counts[keep]
+    buckets = buckets.astype(np.int64)
+
+    if buckets.size:
+        first = buckets.min()
+        span = int(buckets.max() - first + 1)
+        # One flat bincount over (ticker, bucket) pairs, then drop ranges nobody uses
+        keys = ticker_index * span + (buckets - first)
+        table = np.bincount(keys, weights=counts, minlength=len(levels) * span).reshape(len(levels), span)
+        used = np.flatnonzero(table.any(axis=0))
+        buckets, table = used + first, table[:, used].astype(np.int64)
+    else:
+        table = np.zeros((len(levels), 0), dtype=np.int64)
+
+    if range_width is not None:
+        lower_bounds = buckets * range_width
+    else:
+        lower_bounds = np.expm1(buckets * step) * 100
+    return {'buckets': buckets, 'lower_bounds': lower_bounds, 'counts': table}
 
 def calculate_recent_sma(data):
     """Calculate recent 20, 50, and 200 Simple Moving Averages (SMA)."""
-    data['20SMA'] = data['Close'].rolling(window=20, min_periods=1).mean()
-    data['50SMA'] = data['Close'].rolling(window=50, min_periods=1).mean()
-    data['200SMA'] = data['Close'].rolling(window=200, min_periods=1).mean()
-    return data[['Close', '20SMA', '50SMA', '200SMA']].iloc[-1].to_dict()  # Return only the most recent values as dictionary
+    # Only the latest values are needed, so average the tail instead of rolling over the whole history
+    close = data['Close']
+    return {
+        'Close': close.iloc[-1],
+        '20SMA': close.iloc[-20:].mean(),
+        '50SMA': close.iloc[-50:].mean(),
+        '200SMA': close.iloc[-200:].mean()
+    }
 
 def analyze_stock_reversals(ticker, start_date, current_date, tolerance_percentage, num_reversals=3):
     """Fetch data and find potential support or reversal points for a given stock."""
@@ -97,4 +281,37 @@ def analyze_stock_reversals(ticker, start_date, current_date, tolerance_percenta
     reversal_levels = find_reversal_points(data, tolerance_percentage)
     highest_count_reversals = reversal_levels[:num_reversals]
     data_with_sma = calculate_recent_sma(data)
-    return highest_count_reversals, data_with_sma
\ No newline at end of file
+    return highest_count_reversals, data_with_sma
+
+# Calendar days that cover 200 sessions for the 200 SMA: about 270 NSE
+# sessions, so weekends and holidays can't leave it short
+SMA_LOOKBACK_DAYS = 400
+# Defaults of /get-reversal-data, which the nightly materialized table is built with
+REVERSAL_START_DATE = "2024-01-01"
+VOLUME_START_DATE = "2023-01-01"
+TOLERANCE_PERCENTAGE = 3.0
+
+def analyze_reversal_request(ticker, start_date, volume_start_date, end_date, tolerance_percentage, num_reversals=3):
+    """Fetch one superset window and run the reversal, SMA and volume analyses on slices of it.
+
+    Reversals use bars from start_date and the volume trend uses bars from
+    volume_start_date. The SMAs use the whole window, which always reaches far
+    enough back to cover 200 sessions.
+    """
+    start = pd.Timestamp(start_date)
+    volume_start = pd.Timestamp(volume_start_date)
+    sma_start = pd.Timestamp(end_date) - pd.Timedelta(days=SMA_LOOKBACK_DAYS)
+    with stage('fetch', ticker):
+        data = get_stock_data(ticker, min(start, volume_start, sma_start).date(), end_date)
+    if data.empty:
+        raise ValueError(f"No data fetched for {ticker}.")
+
+    # Positional row slices share the parent's memory
+    reversal_data = data.iloc[data.index.searchsorted(start):]
+    volume_data = data.iloc[data.index.searchsorted(volume_start):]
+
+    with stage('indicators', ticker):
+        highest_count_reversals = find_reversal_points(reversal_data, tolerance_percentage)[:num_reversals]
+        volume_analysis = summarize_trend_volumes(ticker, volume_data)
+        sma_values = latest_indicators(ticker, data)
+    return highest_count_reversals, sma_values, volume_analysis
\ No newline at end of file